@@ -1,44 +1,147 @@
 import os
+import re
 import json
-from typing import List, Optional
-from openai import OpenAI
+import asyncio
+from typing import Collection, Dict, List, Optional, Tuple
 
-# 设置API密钥
-os.environ["DEEPSEEK_API_KEY"] = "sk-5dd634970d3e447b99b7e9ad631a5e80"
+# 附加在系统提示词末尾的输出要求：单条识别返回JSON对象，批量识别每行一个意图
+_JSON_INSTRUCTION = '\n\n请只返回JSON对象：{"intent": "意图列表中的一个意图"}'
+_BATCH_INSTRUCTION = "\n\n用户会一次给出多条带编号的消息，请按顺序为每条消息返回一个意图，每行一个，不要编号。"
 
 
 class IntentClassifier:
-    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.deepseek.com"):
+    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.deepseek.com",
+                 cache_size: int = 4096):
         """
         初始化DeepSeek意图分类器
 
         Args:
             api_key: DeepSeek API密钥，如果不提供则从环境变量读取
             base_url: API基础URL
+            cache_size: 识别结果缓存的最大条数，0表示不缓存
         """
         api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         if not api_key:
             raise ValueError("请设置DEEPSEEK_API_KEY环境变量或传递api_key参数")
 
+        # openai 导入较慢，只在真正创建分类器时才导入
+        from openai import OpenAI
+
         self.client = OpenAI(
             api_key=api_key,
             base_url=base_url
         )
+        # 异步客户端在首次使用时按事件循环创建，见 async_client
+        self._api_key = api_key
+        self._base_url = base_url
+        self._async_client = None
+        self._async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # 识别结果缓存：{(消息, 意图集合): 意图}
+        self.cache_size = cache_size
+        self._cache: Dict[Tuple[str, frozenset], str] = {}
+        # 系统提示词缓存：{(意图元组, 输出要求): 提示词}，意图列表在初始化后不变，每轮无需重新拼接
+        self._prompt_cache: Dict[Tuple[Tuple[str, ...], str], str] = {}
+
+    @property
+    def async_client(self):
+        """当前事件循环使用的异步客户端，供并发对话共用，连接池允许多个请求同时进行
+
+        连接池中的连接属于创建它的事件循环，不能在其他事件循环中使用，因此换了事件循环时重新创建；
+        使用异步客户端的事件循环结束前应调用 aclose() 关闭它
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            old_client, old_loop = self._async_client, self._async_client_loop
+            if old_client is not None and old_loop.is_running():
+                # 旧客户端所在的事件循环仍在其他线程中运行，交给它关闭
+                asyncio.run_coroutine_threadsafe(old_client.close(), old_loop)
+            import httpx
+            from openai import AsyncOpenAI
+
+            self._async_client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+                )
+            )
+            self._async_client_loop = loop
+        return self._async_client
+
+    async def aclose(self):
+        """关闭当前事件循环上的异步客户端及其连接池，之后再用到时重新创建"""
+        client = self._async_client
+        if client is not None and self._async_client_loop is asyncio.get_running_loop():
+            self._async_client = None
+            self._async_client_loop = None
+            await client.close()
 
-    def get_intent(self, message: str, may_intent: List[str]) -> str:
+    def get_intent(self, message: str, may_intent: Collection[str]) -> str:
         """
         识别用户消息的意图
 
         Args:
             message: 用户输入的消息
-            may_intent: 可能的意图列表
+            may_intent: 可能的意图（列表、集合等均可，提示词按其迭代顺序列出）
 
         Returns:
             最匹配的意图字符串
         """
+        intent_set = frozenset(may_intent)
+        cached = self._cache_get(message, intent_set)
+        if cached is not None:
+            return cached
+
+        try:
+            # 调用DeepSeek API
+            response = self.client.chat.completions.create(
+                **self._build_request(message, may_intent)
+            )
+            result = self._validate_intent(response.choices[0].message.content, intent_set)
+            self._cache_put(message, intent_set, result)
+            return result
+
+        except Exception as e:
+            print(f"API调用错误: {e}")
+            return "其他"
+
+    async def get_intent_async(self, message: str, may_intent: Collection[str]) -> str:
+        """
+        异步识别用户消息的意图，参数和返回值同 get_intent
+        """
+        intent_set = frozenset(may_intent)
+        cached = self._cache_get(message, intent_set)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self.async_client.chat.completions.create(
+                **self._build_request(message, may_intent)
+            )
+            result = self._validate_intent(response.choices[0].message.content, intent_set)
+            self._cache_put(message, intent_set, result)
+            return result
+
+        except Exception as e:
+            print(f"API调用错误: {e}")
+            return "其他"
+
+    def _cache_get(self, message: str, intent_set: frozenset) -> Optional[str]:
+        """查询缓存的识别结果"""
+        return self._cache.get((message.strip(), intent_set))
 
-        # 构建系统提示词
-        system_prompt = """你是一个意图分类助手。你的任务是从给定的意图列表中，选择最符合用户消息的意图。
+    def _cache_put(self, message: str, intent_set: frozenset, intent: str):
+        """缓存识别结果，超出容量时淘汰最早的条目"""
+        if self.cache_size <= 0:
+            return
+        if len(self._cache) >= self.cache_size:
+            del self._cache[next(iter(self._cache))]
+        self._cache[(message.strip(), intent_set)] = intent
+
+    def _build_system_prompt(self, may_intent: Collection[str]) -> str:
+        """构建系统提示词"""
+        return """你是一个意图分类助手。你的任务是从给定的意图列表中，选择最符合用户消息的意图。
 
 规则：
 1. 只能返回意图列表中存在的字符串
@@ -49,27 +152,152 @@ class IntentClassifier:
 
 意图列表：""" + ", ".join(may_intent)
 
+    def _system_prompt(self, may_intent: Collection[str], instruction: str) -> str:
+        """获取带输出要求的系统提示词，同一意图列表只构建一次"""
+        key = (tuple(may_intent), instruction)
+        prompt = self._prompt_cache.get(key)
+        if prompt is None:
+            prompt = self._prompt_cache[key] = self._build_system_prompt(key[0]) + instruction
+        return prompt
+
+    def _build_request(self, message: str, may_intent: Collection[str]) -> Dict:
+        """构建单条消息的API请求参数，要求模型以JSON对象返回意图"""
+        system_prompt = self._system_prompt(may_intent, _JSON_INSTRUCTION)
+        return dict(
+            model="deepseek-chat",  # 或其他DeepSeek模型
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.1,  # 较低的温度使结果更稳定
+            max_tokens=20  # 只需输出一个很短的JSON对象
+        )
+
+    @staticmethod
+    def _validate_intent(content: str, intent_set: frozenset) -> str:
+        """从模型回复中取出意图（JSON对象或纯文本），并验证是否在意图列表中"""
+        result = content.strip()
         try:
-            # 调用DeepSeek API
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",  # 或其他DeepSeek模型
+            parsed = json.loads(result)
+            if isinstance(parsed, dict):
+                result = str(parsed.get("intent", "")).strip()
+        except ValueError:
+            pass
+
+        if result in intent_set:
+            return result
+        # 如果返回的不在列表中，归为其他
+        return "其他"
+
+
+# 批量回复中每行开头可能带的编号，如 "1. " 或 "2、"
+_LINE_NUMBER_RE = re.compile(r'^\s*\d+\s*[.、:：)]\s*')
+
+
+class BatchedIntentClassifier:
+    """把短时间内到达的多条意图识别请求合并为一次API调用"""
+
+    def __init__(self, classifier: IntentClassifier, max_batch_size: int = 8, batch_window: float = 0.02):
+        """
+        Args:
+            classifier: 实际发起请求的意图分类器
+            max_batch_size: 每批最多合并的消息数
+            batch_window: 收集同一批请求的等待时间（秒）
+        """
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # 队列和后台任务所属的事件循环
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def get_intent(self, message: str, may_intent: Collection[str]) -> str:
+        """提交一条识别请求，等待所在批次返回结果"""
+        cached = self.classifier._cache_get(message, frozenset(may_intent))
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # 后台任务在队列取空后结束；调用方换了事件循环时（旧循环可能已关闭，其中的任务永远不会再运行）
+            # 也要新建队列和任务，不能把请求放进旧循环的队列
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(self._queue))
+
+        future = loop.create_future()
+        self._queue.put_nowait((message, may_intent, future))
+        return await future
+
+    async def close(self):
+        """停止当前事件循环上的后台批处理任务"""
+        worker, self._worker = self._worker, None
+        if worker is not None and not worker.done() and self._loop is asyncio.get_running_loop():
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self, queue: asyncio.Queue):
+        """后台任务：每隔一个时间窗口取出一批请求并分发结果，队列取空后结束"""
+        while not queue.empty():
+            await asyncio.sleep(self.batch_window)
+            batch = []
+            while len(batch) < self.max_batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            # 只有意图列表相同的请求才能合并到同一个提示词中
+            groups: Dict[Tuple[str, ...], List] = {}
+            for item in batch:
+                groups.setdefault(tuple(item[1]), []).append(item)
+
+            await asyncio.gather(*(self._dispatch(list(key), items) for key, items in groups.items()))
+
+    async def _dispatch(self, may_intent: List[str], items: List):
+        """识别一组请求并把结果写回各自的future"""
+        try:
+            if len(items) == 1:
+                results = [await self.classifier.get_intent_async(items[0][0], may_intent)]
+            else:
+                results = await self._classify_batch([item[0] for item in items], may_intent)
+        except Exception as e:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), result in zip(items, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _classify_batch(self, messages: List[str], may_intent: List[str]) -> List[str]:
+        """用一次API调用识别多条消息，回复行数不符时逐条重试"""
+        system_prompt = self.classifier._system_prompt(may_intent, _BATCH_INSTRUCTION)
+        numbered = "\n".join(f"{i}. {message}" for i, message in enumerate(messages, 1))
+
+        try:
+            response = await self.classifier.async_client.chat.completions.create(
+                model="deepseek-chat",
                 messages=[
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message}
+                    {"role": "user", "content": numbered}
                 ],
-                temperature=0.1,  # 较低的温度使结果更稳定
-                max_tokens=50
+                temperature=0.1,
+                max_tokens=50 * len(messages)
             )
-
-            # 提取回复
-            result = response.choices[0].message.content.strip()
-            # 验证结果是否在意图列表中
-            if result in may_intent:
-                return result
-            else:
-                # 如果返回的不在列表中，尝试查找最相似的
-                return "其他"
-
+            lines = [_LINE_NUMBER_RE.sub('', line)
+                     for line in response.choices[0].message.content.strip().splitlines() if line.strip()]
         except Exception as e:
-            print(f"API调用错误: {e}")
-            return "其他"
+            print(f"批量API调用错误: {e}")
+            lines = []
+
+        if len(lines) != len(messages):
+            return list(await asyncio.gather(
+                *(self.classifier.get_intent_async(message, may_intent) for message in messages)))
+        intent_set = frozenset(may_intent)
+        results = [self.classifier._validate_intent(line, intent_set) for line in lines]
+        for message, result in zip(messages, results):
+            self.classifier._cache_put(message, intent_set, result)
+        return results
@@ -1,67 +1,223 @@
-from typing import Dict, Any, Callable, Optional
+import sys
+import asyncio
+import inspect
+import logging
+from typing import Dict, Any, Awaitable, Callable, Iterator, Optional
 from src.dsl.nodes import *
 from src.dsl.runtime import *
+from src.dsl.bytecode import (OP_REPLY, OP_SET, OP_IF_EQ_GOTO, OP_GOTO, OP_GET_INTENT, OP_EXIT,
+                              compile_statements)
+
+log = logging.getLogger(__name__)
+
+# 单次执行允许的最大指令数，用于发现死循环
+MAX_ITERATIONS = 1000
+
+
+def _has_running_loop() -> bool:
+    """当前线程中是否有正在运行的事件循环"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
 
 
 class Interpreter:
-    def __init__(self, runtime: runtime.RuntimeEnvironment):
+    def __init__(self, runtime: RuntimeEnvironment):
         self.runtime = runtime
         self.external_functions: Dict[str, Callable] = {}
         self._has_jumped = False
         self._label_cache = {}  # 已定义的标签位置
-        self._pending_gotos = {}  # 待解析的goto引用：{标签名: [引用位置列表]}
-        self._resolved_gotos = set()  # 已解析的goto引用
-        self._label_statements_processed = set()  # 已处理的标签语句行号
+        self._exec_nodes: List[ASTNode] = []  # 编译后的执行序列（不含标签等无操作语句）
+        self._code: List[tuple] = []  # 与执行序列一一对应的指令
+        self._jump_targets: Dict[str, int] = {}  # 标签名 -> 执行序列下标（不写入共用的语法树节点）
+        self._compiled_for: Optional[ScriptNode] = None  # 当前执行序列由哪个脚本编译而来
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # 同步执行时等待协程用的事件循环
 
         self._execution_paused = False  # 是否暂停执行
         self._pause_reason = None  # 暂停原因
-        self._pending_replies = []  # 待输出的回复
 
-        self._pause_instructions = {
-            "reply",  # 遇到reply应该输出并暂停
-            "get_intent"  # 遇到get_intent应该暂停并等待输入
+        # 节点类型 -> 处理方法（回复直接按编译好的模板片段拼接；标签、标签声明和意图定义在编译时处理，不进入执行序列）
+        self._dispatch: Dict[type, Callable[[ASTNode, int], Optional[str]]] = {
+            SetNode: self._exec_set,
+            PauseForInputNode: self._exec_pause,
+            GetIntentNode: self._exec_get_intent,
+            IfNode: self._exec_if,
+            GotoNode: self._exec_goto,
+            ExitNode: self._exec_exit,
         }
 
 
     def register_function(self, name: str, func: Callable):
-        """注册外部函数"""
+        """注册外部函数（普通函数或协程函数均可）"""
         self.external_functions[name] = func
 
+    def _call_external(self, name: str, *args) -> Any:
+        """调用外部函数，返回协程时在解释器自己的事件循环上等待其结果"""
+        result = self.external_functions[name](*args)
+        if inspect.isawaitable(result):
+            if _has_running_loop():
+                # 同一线程中无法嵌套运行事件循环，协程只能由调用方等待
+                if inspect.iscoroutine(result):
+                    result.close()
+                raise RuntimeError(f"外部函数 {name} 返回了协程，不能在运行中的事件循环里同步执行脚本，"
+                                   f"请改用 execute_script_block_async 等协程接口")
+            # 复用同一个事件循环，异步客户端的连接池可以跨调用保持
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+            result = self._loop.run_until_complete(result)
+        return result
+
+    def close(self, before_close: Optional[Callable[[], Awaitable]] = None):
+        """关闭同步执行时使用的事件循环（先取消其中尚未完成的任务），需在执行脚本的线程中调用
+
+        before_close 为关闭前在该事件循环上等待的清理协程函数，如关闭在这个循环上创建的HTTP客户端
+        """
+        loop, self._loop = self._loop, None
+        if loop is None or loop.is_closed():
+            return
+        try:
+            # 在其他事件循环中调用时无法运行这个循环，直接关闭
+            if not _has_running_loop():
+                if before_close is not None:
+                    loop.run_until_complete(before_close())
+                tasks = asyncio.all_tasks(loop)
+                for task in tasks:
+                    task.cancel()
+                if tasks:
+                    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+
     def execute_script(self, script: ScriptNode) -> List[str]:
         """执行整个脚本，返回所有回复消息"""
-        replies = []
-        # 第一阶段：扫描所有标签定义
+        return list(self.stream_script(script))
+
+    def stream_script(self, script: ScriptNode) -> Iterator[str]:
+        """执行整个脚本，每产生一条回复就立即产出"""
+        # 第一阶段：扫描所有标签定义，并生成执行序列
         self._scan_labels(script)
+        self._compile(script)
 
-        # # 第二阶段：执行脚本
-        # self._execute_script_phase2(script, replies)
         # 第二步：从当前行开始执行
-        self._execute_from_current(script, replies)
-
-        return replies
+        yield from self._execute_from_current(script)
 
     def _scan_labels(self, script: ScriptNode):
-        """第一阶段：扫描并记录所有标签位置"""
-        self._label_cache.clear()
+        """第一阶段：扫描并记录所有标签位置（结果缓存在脚本上，同一脚本只扫描一次）"""
+        labels = getattr(script, '_labels', None)
+        if labels is not None:
+            self._label_cache = dict(labels)
+            return
 
+        self._label_cache.clear()
         for line_num, node in enumerate(script.statements):
             if isinstance(node, LabelNode):
                 self._define_label(node.name, line_num)
+        script._labels = dict(self._label_cache)
+
+    def _collect_intent_definitions(self, script: ScriptNode):
+        """收集脚本中所有intents定义，写入运行时环境（结果缓存在脚本上）"""
+        intents = getattr(script, '_intents', None)
+        if intents is None:
+            all_intents = []
+            for node in script.statements:
+                if isinstance(node, IntentsNode):
+                    all_intents.extend(node.intent_names)
+            intents = script._intents = tuple(dict.fromkeys(all_intents))
+        if intents:
+            self.runtime.set_defined_intents(intents)
+
+    def _compile(self, script: ScriptNode):
+        """生成只包含可执行语句的执行序列，并把goto/if的目标预先解析为序列下标"""
+        self._collect_intent_definitions(script)
+        self._exec_nodes, self._code, self._jump_targets = compile_statements(
+            script.statements, self._label_cache, self.runtime.intern)
+        self._compiled_for = script
+
+    def _render(self, segments: list) -> str:
+        """按片段列表生成回复文本，未赋值的变量替换为空字符串"""
+        slots = self.runtime.var_slots
+        return "".join([
+            segment if isinstance(segment, str) else ("" if slots[segment] is UNSET else str(slots[segment]))
+            for segment in segments
+        ])
+
+    def _execute_current(self) -> Optional[str]:
+        """执行当前行的交互指令（reply、get_intent、暂停），返回回复消息"""
+        pc = self.runtime.current_line
+        op, arg0, _, _ = self._code[pc]
+        if op == OP_REPLY:
+            self._has_jumped = False
+            self._execution_paused = False
+            return self._render(arg0)
+        return self._execute_node(self._exec_nodes[pc], pc)
+
+    def _run_inline(self, limit: int, replies: Optional[List[str]] = None) -> int:
+        """内联执行 set/if/goto/exit 指令，遇到需要交互的指令（reply、get_intent、暂停）时停下
+
+        传入 replies 时 reply 也内联执行，生成的回复追加到 replies 中，
+        这样一个基本块内连续的 reply/set 只需一次调用即可跑完
+        返回执行的指令数，最多执行 limit 条
+        """
+        code = self._code
+        runtime = self.runtime
+        slots = runtime.var_slots
+        n = len(code)
+        pc = runtime.current_line
+        steps = 0
+
+        while pc < n and not runtime.should_exit and steps < limit:
+            op, arg0, arg1, arg2 = code[pc]
+            if op == OP_GOTO:
+                pc = arg0
+            elif op == OP_IF_EQ_GOTO:
+                value = slots[arg0]
+                if value is UNSET:
+                    value = ""
+                pc = arg2 if value == arg1 else pc + 1
+            elif op == OP_SET:
+                if arg1 is not None:
+                    value = slots[arg1]
+                    if value is UNSET:
+                        raise RuntimeError(f"未定义变量: {arg2}")
+                    slots[arg0] = value
+                else:
+                    slots[arg0] = arg2
+                pc += 1
+            elif op == OP_REPLY and replies is not None:
+                replies.append(self._render(arg0))
+                pc += 1
+            elif op == OP_EXIT:
+                runtime.should_exit = True
+                pc += 1
+            else:
+                break
+            steps += 1
+
+        runtime.current_line = pc
+        return steps
 
-    def _execute_from_current(self, script: ScriptNode, replies: List[str]):
-        """从当前行开始执行"""
-        max_iterations = 1000
+    def _execute_from_current(self, script: ScriptNode) -> Iterator[str]:
+        """从当前行开始执行，逐条产出回复"""
         iteration_count = 0
 
-        while (self.runtime.current_line < len(script.statements) and
-               not self.runtime.should_exit and
-               iteration_count < max_iterations):
+        exec_nodes = self._exec_nodes
+        while iteration_count < MAX_ITERATIONS:
+            # 先把连续的 reply/set/if/goto/exit 一次跑完
+            replies = []
+            iteration_count += self._run_inline(MAX_ITERATIONS - iteration_count, replies)
+            yield from replies
+            if (self.runtime.current_line >= len(exec_nodes) or
+                    self.runtime.should_exit or
+                    iteration_count >= MAX_ITERATIONS):
+                break
 
-            node = script.statements[self.runtime.current_line]
-            result = self._execute_node(node, self.runtime.current_line)
+            result = self._execute_current()
 
             if result and isinstance(result, str):
-                replies.append(result)
+                yield result
 
             # 如果没有跳转，前进到下一行
             if not self._has_jumped:
@@ -75,253 +231,166 @@ class Interpreter:
 
             iteration_count += 1
 
-        if iteration_count >= max_iterations:
-            print("⚠️ 可能检测到无限循环")
-
-
-    def _execute_script_phase2(self, script: ScriptNode, replies: List[str]):
-        """第二阶段：执行脚本"""
-        self.runtime.current_line = 0
-        self.runtime.should_exit = False
-        max_iterations = 1000
-        iteration_count = 0
-
-        while (self.runtime.current_line < len(script.statements) and
-               not self.runtime.should_exit and
-               iteration_count < max_iterations):
-
-            node = script.statements[self.runtime.current_line]
-            result = self._execute_node(node, self.runtime.current_line)
-
-            if result and isinstance(result, str):
-                replies.append(result)
-
-            if not self._has_jumped:
-                self.runtime.current_line += 1
-            else:
-                self._has_jumped = False
-
-            iteration_count += 1
-
-        if iteration_count >= max_iterations:
-            raise RuntimeError("Possible infinite loop detected")
+        if iteration_count >= MAX_ITERATIONS:
+            log.warning("⚠️ 可能检测到无限循环")
 
     def _execute_node(self, node: ASTNode, current_line: int) -> Optional[str]:
         """执行单个AST节点，返回回复消息"""
         self._has_jumped = False
         self._execution_paused = False  # 重置暂停状态
-        reply_message = None
-
-        if isinstance(node, LabelDeclarationsNode):
-            # 预先声明标签：添加到缓存
-            for label_name in node.label_names:
-                self._predeclare_label(label_name)
-        elif isinstance(node, IntentsNode):
-            # 处理意图定义节点
-            self.runtime.set_defined_intents(node.intent_names)
-            print(f"📋 定义意图列表: {node.intent_names}")
-        # elif isinstance(node, LabelNode):
-        #     # 标签定义：只记录位置，不执行任何操作
-        #     # 检查标签是否已定义，避免重复处理
-        #     if node.name not in self._label_cache or self._label_cache[node.name] == -1:
-        #         self._define_label(node.name, current_line)
-        #     # 标记标签语句已处理
-        #     self._label_statements_processed.add(current_line)
-        #     # 不产生回复，继续执行下一语句
-        elif isinstance(node, LabelNode):
-            # 标签定义：只记录位置，不执行任何操作
-            # 但只有带@的标签才是真正的定义位置
-            if node.is_definition:
-                if node.name not in self._label_cache or self._label_cache[node.name] == -1:
-                    self._define_label(node.name, current_line)
-                    print(f"📍 定义标签: {node.name} -> 第{current_line}行")
-                else:
-                    print(f"⚠️ 标签重复定义: {node.name}")
-            else:
-                # 不带@的标签引用，只做标记，不定义位置
-                print(f"🏷️  标签引用: {node.name}")
-
-            # 标记标签语句已处理
-            self._label_statements_processed.add(current_line)
-            # 不产生回复，继续执行下一语句
-
-
-        elif isinstance(node, ReplyNode):
-            # 遇到reply指令：立即输出
-            message = self._resolve_variables_in_string(node.message)
-            return message  # 立即返回回复
-
-        elif isinstance(node, SetNode):
-            value = node.value
-            if isinstance(value, str) and value.startswith('$'):
-                actual_value = self.runtime.get_variable(value)
-                if actual_value is None:
-                    raise RuntimeError(f"未定义变量: {value}")
-                value = actual_value
-            self.runtime.set_variable(node.var_name, value)
-            print(f"🔧 设置变量: {node.var_name} = {value}")
-
-        elif isinstance(node, PauseForInputNode):
-            # 等待用户输入
-            print(f"⏸️ 等待用户输入...")
-            self._execution_paused = True
-            self._pause_reason = "wait_for_input"
-            return None
-
-        elif isinstance(node, GetIntentNode):
-            # 遇到get_intent指令：暂停并等待外部处理
-            print(f"⏸️ 执行意图识别: {node.var_name}")
-            # self._execution_paused = True
-            # self._pause_reason = "get_intent"
-
-            # 获取用户输入
-            user_input = self.runtime.get_variable("$user_input", "")
-
-            # 调用外部函数识别意图
-            if "get_intent" in self.external_functions:
-                intent = self.external_functions["get_intent"](user_input)
-                print(f"✅ 识别到意图: {intent}")
-
-                # 设置意图变量
-                self.runtime.set_variable("$intent", intent)
-            else:
-                print(f"⚠️ get_intent函数未注册")
-
-            return None
 
-        elif isinstance(node, IfNode):
-            var_value = self.runtime.get_variable(node.var_name, "")
-            print(f"🔍 条件判断: {node.var_name} == '{node.compare_value}'? 当前值: '{var_value}'")
-            if var_value == node.compare_value:
-                self._jump_to_label(node.target_label, current_line)
-
-        elif isinstance(node, GotoNode):
-            print(f"➡️ 跳转到: {node.target_label}")
-            self._jump_to_label(node.target_label, current_line)
-
-        elif isinstance(node, ExitNode):
-            print("🛑 执行退出指令")
-            self.runtime.should_exit = True
-
-        else:
+        handler = self._dispatch.get(type(node))
+        if handler is None:
             raise RuntimeError(f"未知节点类型: {type(node)}")
-
-        return reply_message
-
-    def _predeclare_label(self, label_name: str):
-        """预先声明标签：标记为已存在但位置未知"""
-        print(f"📋 预声明标签: {label_name}")
-        # 可以设置一个特殊值表示标签已声明但位置未知
-        self._label_cache[label_name] = -1  # 使用-1表示预声明
+        return handler(node, current_line)
+
+    def _exec_set(self, node: SetNode, current_line: int) -> Optional[str]:
+        """设置变量"""
+        value = self._assign(node.var_name, node.value)
+        log.debug("🔧 设置变量: %s = %s", node.var_name, value)
+        return None
+
+    def _assign(self, var_name: str, value: Any) -> Any:
+        """给变量赋值，值为 $变量 时先取出其当前值；返回实际写入的值"""
+        if isinstance(value, str) and value.startswith('$'):
+            actual_value = self.runtime.get_variable(value)
+            if actual_value is None:
+                raise RuntimeError(f"未定义变量: {value}")
+            value = actual_value
+        self.runtime.set_variable(var_name, value)
+        return value
+
+    def _exec_pause(self, node: PauseForInputNode, current_line: int) -> Optional[str]:
+        """等待用户输入"""
+        log.debug("⏸️ 等待用户输入...")
+        self._execution_paused = True
+        self._pause_reason = "wait_for_input"
+        return None
+
+    def _exec_get_intent(self, node: GetIntentNode, current_line: int) -> Optional[str]:
+        """遇到get_intent指令：调用外部函数识别用户输入的意图"""
+        log.debug("⏸️ 执行意图识别: %s", node.var_name)
+
+        # 获取用户输入
+        user_input = self.runtime.get_variable("$user_input", "")
+
+        # 调用外部函数识别意图
+        if "get_intent" in self.external_functions:
+            intent = self._call_external("get_intent", user_input)
+            log.debug("✅ 识别到意图: %s", intent)
+
+            # 设置意图变量
+            self._set_intent(intent)
+        else:
+            log.warning("⚠️ get_intent函数未注册")
+
+        return None
+
+    def _set_intent(self, intent: Any):
+        """写入意图变量；字符串驻留后与 if 中同样驻留的比较值判等时走同一对象的快速路径"""
+        if isinstance(intent, str):
+            intent = sys.intern(intent)
+        self.runtime.set_variable("$intent", intent)
+
+    def _exec_if(self, node: IfNode, current_line: int) -> Optional[str]:
+        """条件跳转"""
+        var_value = self.runtime.get_variable(node.var_name, "")
+        log.debug("🔍 条件判断: %s == '%s'? 当前值: '%s'", node.var_name, node.compare_value, var_value)
+        if var_value == node.compare_value:
+            self._jump_to_label(node)
+        return None
+
+    def _exec_goto(self, node: GotoNode, current_line: int) -> Optional[str]:
+        """无条件跳转"""
+        log.debug("➡️ 跳转到: %s", node.target_label)
+        self._jump_to_label(node)
+        return None
+
+    def _exec_exit(self, node: ExitNode, current_line: int) -> Optional[str]:
+        """退出指令"""
+        log.debug("🛑 执行退出指令")
+        self.runtime.should_exit = True
+        return None
 
     def _define_label(self, label_name: str, line_number: int):
-        """定义标签：添加到缓存并解析待处理的引用"""
+        """定义标签：添加到缓存"""
         # 避免重复定义
         if label_name in self._label_cache and self._label_cache[label_name] == line_number:
             return
 
-        print(f"📍 定义标签: {label_name} -> 第{line_number}行")
+        log.debug("📍 定义标签: %s -> 第%d行", label_name, line_number)
         self._label_cache[label_name] = line_number
 
-        # 检查是否有待解析的goto引用
-        if label_name in self._pending_gotos:
-            print(f"🔗 解析待处理的goto引用: {label_name}")
-            # 可以在这里重新执行那些goto语句，或者只是记录已解析
-            self._resolved_gotos.add(label_name)
-            del self._pending_gotos[label_name]
-
-    # def _jump_to_label(self, label_name: str, current_line: int):
-    #     """跳转到标签：如果标签已声明直接跳转，否则记录待解析"""
-    #     if label_name in self._label_cache:
-    #         # 标签已声明
-    #         target_line = self._label_cache[label_name]
-    #         if target_line != -1:  # 标签位置已确定
-    #             # 检查目标行是否是标签定义语句
-    #             if target_line in self._label_statements_processed:
-    #                 # 如果目标行是标签定义，跳转到下一行
-    #                 target_line += 1
-    #                 print(f"🔧 调整跳转位置: {label_name} -> 第{target_line}行（跳过标签定义）")
-    #
-    #             self.runtime.current_line = target_line
-    #             self._has_jumped = True
-    #             print(f"🔀 跳转到: {label_name} (第{target_line}行)")
-    #         else:
-    #             # 标签已声明但位置未知，记录待解析
-    #             if label_name not in self._pending_gotos:
-    #                 self._pending_gotos[label_name] = []
-    #             self._pending_gotos[label_name].append(current_line)
-    #             print(f"⏳ 等待标签定义: {label_name} (从第{current_line}行引用)")
-    #     else:
-    #         # 标签未声明，报错
-    #         raise RuntimeError(f"未声明的标签: {label_name}")
-    def _jump_to_label(self, label_name: str, current_line: int):
-        """跳转到标签"""
-        if label_name in self._label_cache:
-            target_line = self._label_cache[label_name]
-
-            # 确保目标行是有效的
-            if target_line < len(self.runtime.current_script.statements):
-                # 如果目标行是标签定义行，跳转到下一行
-                next_node = self.runtime.current_script.statements[target_line + 1] if target_line + 1 < len(
-                    self.runtime.current_script.statements) else None
-
-                # 判断是否需要跳转到标签的下一行
-                if isinstance(self.runtime.current_script.statements[target_line], LabelNode):
-                    target_line += 1
-
-                self.runtime.current_line = target_line
-                self._has_jumped = True
-                print(f"✅ 跳转成功: {label_name} -> 第{target_line}行")
-            else:
-                raise RuntimeError(f"标签位置越界: {label_name}")
-        else:
-            print(f"❌ 未定义的标签: {label_name}")
-            # 不再抛出异常，而是继续执行下一行
-            self._has_jumped = False
-
-    def _check_unresolved_labels(self):
-        """检查是否有未解析的标签引用"""
-        if self._pending_gotos:
-            print("❌ 未解析的标签引用:")
-            for label_name, references in self._pending_gotos.items():
-                print(f"  - {label_name} 被以下行引用: {references}")
-            raise RuntimeError(f"存在未定义的标签: {list(self._pending_gotos.keys())}")
+    def _jump_to_label(self, node):
+        """跳转到goto/if目标标签在执行序列中的下标（编译时已解析）"""
+        self.runtime.current_line = self._jump_targets[node.target_label]
+        self._has_jumped = True
 
     def get_label_status(self):
-        """获取标签解析状态（用于调试）"""
+        """获取标签解析状态（用于调试）；标签引用在编译时已全部解析"""
         return {
-            'defined_labels': list(self._label_cache.keys()),
-            'pending_gotos': self._pending_gotos,
-            'resolved_gotos': list(self._resolved_gotos)
+            'defined_labels': list(self._label_cache.keys())
         }
 
-    def _resolve_variables_in_string(self, text: str) -> str:
-        """解析字符串中的变量引用（如 "Hello $name"）"""
-        result = text
-        # 简单的变量替换：查找 $variable 模式
-        import re
-        variable_pattern = r'\$[a-zA-Z_][a-zA-Z0-9_]*'
+    def execute_script_step(self, script: ScriptNode) -> Optional[str]:
+        """单步执行脚本：先内联跑完连续的 set/if/goto/exit，再执行一条交互指令后返回"""
+        self._run_inline(MAX_ITERATIONS)
+        if self.runtime.current_line >= len(self._exec_nodes) or self.runtime.should_exit:
+            return None
 
-        for match in re.finditer(variable_pattern, text):
-            var_name = match.group()
-            var_value = self.runtime.get_variable(var_name, "")
-            result = result.replace(var_name, str(var_value))
+        result = self._execute_current()
+
+        if not self._has_jumped:
+            self.runtime.current_line += 1
 
         return result
 
-    def execute_script_step(self, script: ScriptNode) -> Optional[str]:
-        """单步执行脚本：执行一条指令后返回（如果暂停）"""
-        if self.runtime.current_line >= len(script.statements):
+    def execute_script_block(self, script: ScriptNode) -> List[str]:
+        """执行一个基本块：内联跑完连续的 reply/set/if/goto/exit，再执行结尾的一条交互指令，返回期间的所有回复"""
+        replies = []
+        self._run_inline(MAX_ITERATIONS, replies)
+        result = self.execute_script_step(script)
+        if result:
+            replies.append(result)
+        return replies
+
+    async def execute_script_block_async(self, script: ScriptNode) -> List[str]:
+        """execute_script_block 的协程版本，结尾的 get_intent 在调用方的事件循环中等待"""
+        replies = []
+        self._run_inline(MAX_ITERATIONS, replies)
+        result = await self.execute_script_step_async(script)
+        if result:
+            replies.append(result)
+        return replies
+
+    async def execute_script_step_async(self, script: ScriptNode) -> Optional[str]:
+        """execute_script_step 的协程版本：get_intent 在调用方的事件循环中等待，不阻塞其他对话"""
+        self._run_inline(MAX_ITERATIONS)
+        runtime = self.runtime
+        if runtime.current_line >= len(self._exec_nodes) or runtime.should_exit:
             return None
 
-        node = script.statements[self.runtime.current_line]
-        result = self._execute_node(node, self.runtime.current_line)
+        if self._code[runtime.current_line][0] == OP_GET_INTENT and "get_intent" in self.external_functions:
+            self._has_jumped = False
+            self._execution_paused = False
+            intent = self.external_functions["get_intent"](runtime.get_variable("$user_input", ""))
+            if inspect.isawaitable(intent):
+                intent = await intent
+            log.debug("✅ 识别到意图: %s", intent)
+            self._set_intent(intent)
+            result = None
+        else:
+            result = self._execute_current()
 
         if not self._has_jumped:
-            self.runtime.current_line += 1
+            runtime.current_line += 1
 
         return result
 
+    def get_statement_count(self) -> int:
+        """获取编译后执行序列中的语句数量"""
+        return len(self._exec_nodes)
+
     def is_execution_paused(self) -> bool:
         """检查执行是否暂停"""
         return self._execution_paused
@@ -0,0 +1,90 @@
+"""
+DSL 字节码：操作码定义，以及把脚本语句编译为扁平指令序列
+"""
+import re
+import sys
+from typing import Callable, Dict, List, Sequence, Tuple
+from src.dsl.nodes import *
+
+# 字符串中的变量引用，如 "Hello $name"（带捕获组，split 时保留变量名）
+VAR_RE = re.compile(r'(\$[a-zA-Z_][a-zA-Z0-9_]*)')
+
+# 操作码
+OP_REPLY = 0
+OP_SET = 1
+OP_IF_EQ_GOTO = 2
+OP_GOTO = 3
+OP_GET_INTENT = 4
+OP_EXIT = 5
+OP_PAUSE = 6
+
+OPCODES = {
+    ReplyNode: OP_REPLY,
+    SetNode: OP_SET,
+    GetIntentNode: OP_GET_INTENT,
+    IfNode: OP_IF_EQ_GOTO,
+    GotoNode: OP_GOTO,
+    ExitNode: OP_EXIT,
+    PauseForInputNode: OP_PAUSE,
+}
+
+# 运行时不做任何事的语句，编译时直接剔除
+_NO_OP_NODES = (LabelNode, IntentsNode, LabelDeclarationsNode)
+
+
+def compile_statements(statements: Sequence[ASTNode], labels: Dict[str, int],
+                       intern: Callable[[str], int]) -> Tuple[List[ASTNode], List[tuple], Dict[str, int]]:
+    """把语句编译为执行序列、对应的指令和跳转表（标签名 -> 序列下标），goto/if 的目标预先解析为序列下标
+
+    labels 为标签名到原语句下标的映射，intern 为变量名到变量槽下标的映射函数
+    语法树可能被多个解释器共用（见 parser.parse_cached），编译结果只写入返回值，不修改节点
+    """
+    exec_nodes = []
+    old_to_new = {}
+    for line_num, node in enumerate(statements):
+        old_to_new[line_num] = len(exec_nodes)
+        if not isinstance(node, _NO_OP_NODES):
+            exec_nodes.append(node)
+    old_to_new[len(statements)] = len(exec_nodes)
+
+    # 标签行已被剔除，映射后即为标签之后的第一条可执行语句
+    targets = {label: old_to_new[line] for label, line in labels.items() if line in old_to_new}
+    for node in exec_nodes:
+        if isinstance(node, (GotoNode, IfNode)) and node.target_label not in targets:
+            raise RuntimeError(f"未定义的标签: {node.target_label}")
+
+    return exec_nodes, [lower(node, intern, targets) for node in exec_nodes], targets
+
+
+def lower(node: ASTNode, intern: Callable[[str], int], targets: Dict[str, int]) -> tuple:
+    """把节点降为 (操作码, 参数0, 参数1, 参数2) 形式的指令，变量名替换为变量槽下标，跳转标签替换为 targets 中的序列下标"""
+    if isinstance(node, SetNode):
+        # 参数：目标槽、来源槽（值为字面量时为None）、原始值
+        value = node.value
+        source_slot = intern(value) if isinstance(value, str) and value.startswith('$') else None
+        return OP_SET, intern(node.var_name), source_slot, value
+    if isinstance(node, IfNode):
+        # 解析器已驻留比较值，但从磁盘缓存反序列化的语法树不保留驻留，这里再驻留一次
+        compare_value = node.compare_value
+        if isinstance(compare_value, str):
+            compare_value = sys.intern(compare_value)
+        return OP_IF_EQ_GOTO, intern(node.var_name), compare_value, targets[node.target_label]
+    if isinstance(node, GotoNode):
+        return OP_GOTO, targets[node.target_label], None, None
+    if isinstance(node, ReplyNode):
+        return OP_REPLY, compile_template(node.message, intern), None, None
+    opcode = OPCODES.get(type(node))
+    if opcode is None:
+        raise RuntimeError(f"未知节点类型: {type(node)}")
+    return opcode, None, None, None
+
+
+def compile_template(text: str, intern: Callable[[str], int]) -> list:
+    """把回复模板拆成片段列表：字面量为字符串，变量引用为变量槽下标"""
+    segments = []
+    for i, part in enumerate(VAR_RE.split(text)):
+        if i % 2:
+            segments.append(intern(part))
+        elif part:
+            segments.append(part)
+    return segments
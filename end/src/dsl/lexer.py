@@ -1,126 +1,143 @@
 import re
-from typing import List, Optional
-
-
-# 定义Token类型
-class TokenType:
-    REPLY = "REPLY"
-    SET = "SET"
-    GET_INTENT = "GET_INTENT"
-    IF = "IF"
-    THEN = "THEN"
-    GOTO = "GOTO"
-    EXIT = "EXIT"
-    EQUALS = "EQUALS"
-    STRING = "STRING"
-    VARIABLE = "VARIABLE"
-    LABEL = "LABEL"
-    LABELS = "LABELS"
-    COLON = "COLON"
-    NEWLINE = "NEWLINE"
-    EOF = "EOF"
-    INTENTS = "INTENTS"
-    LBRACE = "LBRACE"
-    RBRACE = "RBRACE"
-    COMMA = "COMMA"
-    PAUSE_FOR_INPUT = "PAUSE_FOR_INPUT"
-    AT_SYMBOL = "AT_SYMBOL"
-
-class Token:
-    def __init__(self, type: str, value: str, line: int, column: int):
-        self.type = type
-        self.value = value
-        self.line = line
-        self.column = column
+import functools
+from enum import IntEnum, auto
+from typing import List, NamedTuple, Optional, Tuple
+
+
+# 定义Token类型（整数枚举，比较时是整数比较而不是字符串比较）
+class TokenType(IntEnum):
+    REPLY = auto()
+    SET = auto()
+    GET_INTENT = auto()
+    IF = auto()
+    THEN = auto()
+    GOTO = auto()
+    EXIT = auto()
+    EQUALS = auto()
+    STRING = auto()
+    VARIABLE = auto()
+    LABEL = auto()
+    LABELS = auto()
+    COLON = auto()
+    NEWLINE = auto()
+    EOF = auto()
+    INTENTS = auto()
+    LBRACE = auto()
+    RBRACE = auto()
+    COMMA = auto()
+    PAUSE_FOR_INPUT = auto()
+    AT_SYMBOL = auto()
+
+class Token(NamedTuple):
+    type: TokenType
+    value: str
+    line: int = 0
+    column: int = 0
 
     def __repr__(self) -> str:
-        return f"Token({self.type}, '{self.value}', line {self.line})"
+        return f"Token({self.type.name}, '{self.value}', line {self.line})"
+
+
+# 关键字表：整词匹配后查表得到Token类型
+_KEYWORDS = {
+    'intents': TokenType.INTENTS,
+    'labels': TokenType.LABELS,
+    'reply': TokenType.REPLY,
+    'set': TokenType.SET,
+    'get_intent': TokenType.GET_INTENT,
+    'pause_for_user_input': TokenType.PAUSE_FOR_INPUT,
+    'if': TokenType.IF,
+    'then': TokenType.THEN,
+    'goto': TokenType.GOTO,
+    'exit': TokenType.EXIT,
+}
+
+# Token正则规则
+# 关键字后紧跟冒号时（如 exit:）视为标签，因此加上 (?!:)
+# 空白连同其后的注释作为一次匹配跳过；其他规则都不以空白或#开头，放在最前不影响结果
+_TOKEN_SPECS = [
+    ('SKIP', r'[ \t]*#[^\n]*|[ \t]+'),
+    ('KEYWORD', r'\b(?:' + '|'.join(_KEYWORDS) + r')\b(?!:)'),
+    (TokenType.EQUALS, r'=='),
+    (TokenType.LBRACE, r'\{'),
+    (TokenType.RBRACE, r'\}'),
+    (TokenType.COMMA, r','),
+    (TokenType.AT_SYMBOL, r'@'),
+    (TokenType.STRING, r'\"[^\"]*\"'),
+    (TokenType.VARIABLE, r'\$[a-zA-Z_][a-zA-Z0-9_]*'),
+    (TokenType.LABEL, r'[a-zA-Z_][a-zA-Z0-9_]*:'),
+    (TokenType.COLON, r':'),
+    (TokenType.NEWLINE, r'\n'),
+    ('MISMATCH', r'.'),
+]
+
+# 所有规则合成一个正则，模块加载时编译一次（空白和注释也作为命名组，由正则引擎一次扫描完成）
+# 命名组只能用字符串，Token类型以其名字作为组名
+_PATTERN = re.compile('|'.join(f'(?P<{getattr(name, "name", name)}>{pattern})'
+                               for name, pattern in _TOKEN_SPECS))
+# 组名 -> Token类型
+_GROUP_TYPES = {name.name: name for name, _ in _TOKEN_SPECS if isinstance(name, TokenType)}
 
 
 class Lexer:
     def __init__(self, source: str):
         self.source = source
-        self.position = 0
         self.line = 1
-        self.column = 1
         self.tokens: List[Token] = []
 
-        # Token正则规则
-        self.token_specs = [
-            (TokenType.INTENTS, r'intents'),
-            (TokenType.LABELS, r'labels'),
-            (TokenType.REPLY, r'reply'),
-            (TokenType.SET, r'set'),
-            (TokenType.GET_INTENT, r'get_intent'),
-            (TokenType.PAUSE_FOR_INPUT, r'pause_for_user_input'),
-            (TokenType.IF, r'if'),
-            (TokenType.THEN, r'then'),
-            (TokenType.GOTO, r'goto'),
-            (TokenType.EQUALS, r'=='),
-            (TokenType.LBRACE, r'\{'),
-            (TokenType.RBRACE, r'\}'),
-            (TokenType.COMMA, r','),
-            (TokenType.AT_SYMBOL, r'@'),
-            (TokenType.STRING, r'\"[^\"]*\"'),
-            (TokenType.VARIABLE, r'\$[a-zA-Z_][a-zA-Z0-9_]*'),
-            (TokenType.LABEL, r'[a-zA-Z_][a-zA-Z0-9_]*:'),
-            (TokenType.COLON, r':'),
-            (TokenType.NEWLINE, r'\n'),
-            (TokenType.EXIT, r'exit'),
-            ('SKIP', r'[ \t]+'),
-            ('COMMENT', r'#.*'),
-        ]
-
-        # 编译正则表达式
-        self.regex_pattern = '|'.join(
-            f'(?P<{name}>{pattern})' for name, pattern in self.token_specs if name not in ['SKIP', 'COMMENT'])
-        self.pattern = re.compile(self.regex_pattern)
+        # 规则表和正则在模块级预先编译，所有Lexer实例共用
+        self._keywords = _KEYWORDS
+        self.token_specs = _TOKEN_SPECS
+        self.pattern = _PATTERN
+        self.regex_pattern = _PATTERN.pattern
+        self._group_types = _GROUP_TYPES
 
     def tokenize(self) -> List[Token]:
         """将源代码转换为token列表"""
-        self.tokens = []
-        self.position = 0
-        self.line = 1
+        self.tokens = tokens = []
+        append = tokens.append
+        keywords = self._keywords
+        group_types = self._group_types
+        line = 1
+        line_start = 0  # 当前行首在源码中的偏移，用于计算列号
 
-        while self.position < len(self.source):
-            # 跳过空白字符和注释
-            if self.source[self.position] in ' \t':
-                self.position += 1
-                continue
-            if self.source[self.position] == '#':
-                # 跳过注释直到行尾
-                while self.position < len(self.source) and self.source[self.position] != '\n':
-                    self.position += 1
+        for match in self.pattern.finditer(self.source):
+            token_type = match.lastgroup
+            if token_type == 'SKIP':
                 continue
 
-            # 使用正则匹配
-            match = self.pattern.match(self.source, self.position)
-            if match:
-                token_type = match.lastgroup
-                token_value = match.group()
-
-                if token_type == TokenType.STRING:
-                    # 去掉字符串的引号
-                    token_value = token_value[1:-1]
-                elif token_type == TokenType.LABEL:
-                    # 去掉标签的冒号
-                    token_value = token_value[:-1]
-                # 创建Token并添加到列表
-                token = Token(token_type, token_value, self.line, self.column)
-                self.tokens.append(token)
-
-                # 更新位置
-                self.position = match.end()
-                if token_type == TokenType.NEWLINE:
-                    self.line += 1
-                    self.column = 1
-                else:
-                    self.column += len(token_value)
-            else:
+            column = match.start() - line_start + 1
+            if token_type == 'MISMATCH':
                 # 无法识别的字符
+                self.line = line
                 raise SyntaxError(
-                    f"Unknown character at line {self.line}, column {self.column}: '{self.source[self.position]}'")
+                    f"Unknown character at line {line}, column {column}: '{match.group()}'")
+
+            token_value = match.group()
+            if token_type == 'KEYWORD':
+                token_type = keywords[token_value]
+            else:
+                token_type = group_types[token_type]
+
+            if token_type == TokenType.STRING:
+                # 去掉字符串的引号
+                token_value = token_value[1:-1]
+            elif token_type == TokenType.LABEL:
+                # 去掉标签的冒号
+                token_value = token_value[:-1]
+            append(Token(token_type, token_value, line, column))
+
+            if token_type == TokenType.NEWLINE:
+                line += 1
+                line_start = match.end()
 
         # 添加文件结束标记
-        self.tokens.append(Token(TokenType.EOF, "", self.line, self.column))
-        return self.tokens
\ No newline at end of file
+        self.line = line
+        append(Token(TokenType.EOF, "", line, len(self.source) - line_start + 1))
+        return tokens
+
+
+@functools.lru_cache(maxsize=256)
+def tokenize_cached(source: str) -> Tuple[Token, ...]:
+    """词法分析源码，相同的源码直接返回缓存的token元组（被所有调用方共用，不要修改其中的token）"""
+    return tuple(Lexer(source).tokenize())
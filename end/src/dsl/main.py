@@ -1,19 +1,31 @@
 import os
 import sys
+import asyncio
 import threading
 import time
+import traceback
 from typing import Optional
 from pathlib import Path
 
 # 导入DSL控制器和GUI
-from src.dsl.main_controller import DSLController
+from src.dsl.main_controller import DSLController, EXIT_COMMANDS
 from src.dsl.ui import ChatbotGUI
 
+# 环境变量在进程运行期间不会变化，导入时读取一次
+_LLM_API_KEY = os.environ.get("DEEPSEEK_API_KEY")
+
+
+def _refresh_env():
+    """重新读取环境变量（仅在运行期间修改了环境变量时需要）"""
+    global _LLM_API_KEY
+    _LLM_API_KEY = os.environ.get("DEEPSEEK_API_KEY")
+
 
 class DSLApplication:
     """DSL聊天机器人主应用程序"""
 
-    def __init__(self, script_path: str, llm_api_key: Optional[str] = None, timeout_minutes: int = 10):
+    def __init__(self, script_path: str, llm_api_key: Optional[str] = None, timeout_minutes: int = 10,
+                 use_cache: bool = False):
         """
         初始化应用程序
 
@@ -21,10 +33,12 @@ class DSLApplication:
             script_path: DSL脚本文件路径
             llm_api_key: DeepSeek API密钥
             timeout_minutes: 无操作超时时间（分钟）
+            use_cache: 是否使用磁盘上缓存的脚本解析结果
         """
         self.script_path = script_path
         self.llm_api_key = llm_api_key
         self.timeout_minutes = timeout_minutes
+        self.use_cache = use_cache
 
         # 初始化组件
         self.controller: Optional[DSLController] = None
@@ -32,7 +46,9 @@ class DSLApplication:
 
         # 超时控制
         self.last_activity_time = time.time()
-        self.timeout_timer: Optional[threading.Timer] = None
+        self.monitor_thread: Optional[threading.Thread] = None
+        self._activity_event = threading.Event()  # 用于在清理时立即唤醒监控线程
+        self._input_thread: Optional[threading.Thread] = None  # 命令行模式读取输入的线程
         self.is_running = False
 
         # 验证脚本文件
@@ -52,7 +68,8 @@ class DSLApplication:
             # 1. 初始化控制器
             self.controller = DSLController(
                 script_path=self.script_path,
-                llm_api_key=self.llm_api_key
+                llm_api_key=self.llm_api_key,
+                use_cache=self.use_cache
             )
             self.controller.initialize()
 
@@ -66,26 +83,33 @@ class DSLApplication:
             raise
 
     def start_activity_monitor(self):
-        """启动活动监控（超时自动退出）"""
-        if self.timeout_timer:
-            self.timeout_timer.cancel()
-
+        """启动活动监控（超时自动退出），整个运行期间只使用一个监控线程"""
         self.last_activity_time = time.time()
-        self.timeout_timer = threading.Timer(60.0, self._check_timeout)  # 每分钟检查一次
-        self.timeout_timer.daemon = True
-        self.timeout_timer.start()
+        if self.timeout_minutes <= 0:
+            return  # 超时功能已禁用
+        if self.monitor_thread and self.monitor_thread.is_alive():
+            return
+
+        self._activity_event.clear()
+        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self.monitor_thread.start()
+
+    def _monitor_loop(self):
+        """监控线程：每分钟检查一次是否超时，清理时被立即唤醒"""
+        while self.is_running:
+            self._activity_event.wait(timeout=60.0)
+            self._activity_event.clear()
+            if not self.is_running:
+                break
+            self._check_timeout()
 
     def _check_timeout(self):
         """检查是否超时"""
         if not self.is_running:
             return
 
-        idle_time = time.time() - self.last_activity_time
-        idle_minutes = idle_time / 60
-
         # 如果超时，自动退出
-        if idle_minutes >= self.timeout_minutes:
-            print(f"⏰ 检测到{self.timeout_minutes}分钟无操作，自动退出...")
+        if self._timeout_reached():
             self.cleanup()
             if self.gui:
                 # 在GUI线程中显示退出消息
@@ -93,13 +117,28 @@ class DSLApplication:
             else:
                 print("👋 感谢使用，再见！")
                 sys.exit(0)
-        else:
-            # 继续监控
-            remaining_time = self.timeout_minutes - int(idle_minutes)
-            if remaining_time <= 3:  # 最后3分钟提醒
-                print(f"💡 提示: 系统将在{remaining_time}分钟后因无操作自动退出")
 
-            self.start_activity_monitor()
+    def _timeout_reached(self) -> bool:
+        """根据空闲时间判断是否超时，临近超时时给出提醒"""
+        idle_minutes = (time.time() - self.last_activity_time) / 60
+
+        if idle_minutes >= self.timeout_minutes:
+            print(f"⏰ 检测到{self.timeout_minutes}分钟无操作，自动退出...")
+            return True
+
+        remaining_time = self.timeout_minutes - int(idle_minutes)
+        if remaining_time <= 3:  # 最后3分钟提醒
+            print(f"💡 提示: 系统将在{remaining_time}分钟后因无操作自动退出")
+        return False
+
+    async def _monitor_timeout_async(self, main_task: asyncio.Task):
+        """命令行模式的超时监控：每分钟检查一次，超时后取消正在等待输入的主任务"""
+        while self.is_running:
+            await asyncio.sleep(60.0)
+            if self.is_running and self._timeout_reached():
+                self.is_running = False
+                main_task.cancel()
+                return
 
     def _show_timeout_message(self):
         """在GUI中显示超时消息"""
@@ -110,13 +149,71 @@ class DSLApplication:
             self.gui.root.after(2000, self.gui.on_exit)
 
     def record_user_activity(self):
-        """记录用户活动时间"""
+        """记录用户活动时间（监控线程会在下次检查时读取）"""
         self.last_activity_time = time.time()
-        if self.is_running:
-            self.start_activity_monitor()
 
     def run_cli_mode(self):
         """运行命令行交互模式"""
+        try:
+            asyncio.run(self.run_cli_mode_async())
+        except BaseException as e:
+            if not self._input_pending():
+                raise
+            # 读取输入的线程仍阻塞在input()上，解释器无法正常退出：报告异常后以非零状态直接结束进程
+            if isinstance(e, KeyboardInterrupt):
+                print("\n\n👋 用户中断程序")
+                self._exit_now(130)
+            if isinstance(e, SystemExit):
+                self._exit_now(e.code if isinstance(e.code, int) else 1)
+            traceback.print_exc()
+            self._exit_now(1)
+
+        if self._input_pending():
+            # 超时退出时读取输入的线程仍阻塞在input()上，解释器正常退出时会因此报错，直接结束进程
+            self._exit_now(0)
+
+    def _input_pending(self) -> bool:
+        """读取输入的线程是否仍阻塞在input()上"""
+        return self._input_thread is not None and self._input_thread.is_alive()
+
+    @staticmethod
+    def _exit_now(code: int):
+        """刷新输出后立即以给定状态码结束进程（不经过解释器的正常退出流程）"""
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+    async def _ainput(self, prompt: str) -> str:
+        """在守护线程中读取一行输入，等待期间事件循环可以继续处理其他任务"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def deliver(setter, value):
+            if not future.done():
+                setter(value)
+
+        def read():
+            try:
+                line = input(prompt)
+            except BaseException as e:
+                loop.call_soon_threadsafe(deliver, future.set_exception, e)
+            else:
+                loop.call_soon_threadsafe(deliver, future.set_result, line)
+
+        # 守护线程：超时退出时不必等待input()返回
+        self._input_thread = threading.Thread(target=read, daemon=True)
+        self._input_thread.start()
+        return await future
+
+    @staticmethod
+    def _print_replies(replies):
+        """一次写出本轮的所有回复"""
+        if replies:
+            sys.stdout.write("".join(f"🤖🤖 机器人: {reply}\n" for reply in replies))
+            sys.stdout.flush()
+
+    async def run_cli_mode_async(self):
+        """命令行交互模式（协程版本）：等待输入时事件循环仍可运行超时监控等任务"""
         print("\n" + "=" * 70)
         print("🤖 DSL聊天机器人 - 命令行模式")
         print("=" * 70)
@@ -125,19 +222,21 @@ class DSLApplication:
         print("-" * 70)
 
         self.is_running = True
-        self.start_activity_monitor()
+        self.last_activity_time = time.time()
+        monitor = None
+        if self.timeout_minutes > 0:
+            monitor = asyncio.create_task(self._monitor_timeout_async(asyncio.current_task()))
 
         try:
             # 执行初始脚本显示欢迎消息
-            initial_replies = self.controller._execute_script()
-            for reply in initial_replies:
-                print(f"🤖🤖 机器人: {reply}")
+            initial_replies = await self.controller.execute_with_input_async()
+            self._print_replies(initial_replies)
 
             # 主循环
             while self.is_running and not self.controller.runtime.should_exit:
                 try:
                     # 获取用户输入
-                    user_input = input("\n👤👤 您: ").strip()
+                    user_input = (await self._ainput("\n👤👤 您: ")).strip()
 
                     # 记录用户活动
                     self.record_user_activity()
@@ -146,26 +245,33 @@ class DSLApplication:
                         continue
 
                     # 检查退出命令
-                    if user_input.lower() in ['退出', 'exit', 'quit', 'bye']:
+                    if user_input.casefold() in EXIT_COMMANDS:
                         print("\n👋👋 感谢使用，再见！")
                         break
 
                     # 处理用户输入
-                    self.controller.runtime.set_variable("$user_input", user_input)
-                    replies = self.controller._execute_script()
+                    replies = await self.controller.execute_with_input_async(user_input)
 
                     # 输出回复
-                    for reply in replies:
-                        print(f"🤖🤖 机器人: {reply}")
+                    self._print_replies(replies)
 
-                except KeyboardInterrupt:
+                except (KeyboardInterrupt, EOFError):
                     print("\n\n👋👋 用户中断，退出系统")
                     break
                 except Exception as e:
                     print(f"❌❌ 系统错误: {e}")
                     print("💡💡 您可以继续输入或输入'退出'结束对话")
 
+        except asyncio.CancelledError:
+            # 超时监控取消了主任务
+            if self.is_running:
+                raise
+            print("👋 感谢使用，再见！")
         finally:
+            if monitor:
+                monitor.cancel()
+            if self.controller:
+                await self.controller.aclose()
             self.cleanup()
 
     def run_gui_mode(self):
@@ -178,7 +284,8 @@ class DSLApplication:
             # 创建GUI实例
             self.gui = ChatbotGUI(
                 script_path=self.script_path,
-                llm_api_key=self.llm_api_key
+                llm_api_key=self.llm_api_key,
+                use_cache=self.use_cache
             )
 
             # 设置活动记录回调
@@ -222,9 +329,12 @@ class DSLApplication:
         """清理资源"""
         self.is_running = False
 
-        if self.timeout_timer:
-            self.timeout_timer.cancel()
-            self.timeout_timer = None
+        # 唤醒监控线程，使其立即退出
+        self._activity_event.set()
+        self.monitor_thread = None
+
+        if self.controller:
+            self.controller.close()
 
         print("🧹 应用程序资源清理完成")
 
@@ -234,8 +344,6 @@ def main():
 
     # 配置参数
     SCRIPT_PATH = "C:/Users/hotma/Desktop/DSL/end/DSL2.txt"  # 默认脚本路径
-
-    LLM_API_KEY = os.getenv("sk-5dd634970d3e447b99b7e9ad631a5e80")  # 从环境变量获取API密钥
     TIMEOUT_MINUTES = 15  # 默认15分钟无操作自动退出
 
     # 解析命令行参数
@@ -243,7 +351,7 @@ def main():
     parser = argparse.ArgumentParser(description="DSL聊天机器人应用程序")
     parser.add_argument("--script", "-s", default=SCRIPT_PATH,
                         help="DSL脚本文件路径 (默认: scripts/chatbot.dsl)")
-    parser.add_argument("--api-key", "-k", default=LLM_API_KEY,
+    parser.add_argument("--api-key", "-k", default=_LLM_API_KEY,
                         help="DeepSeek API密钥 (默认: 从环境变量DEEPSEEK_API_KEY获取)")
     parser.add_argument("--mode", "-m", choices=["cli", "gui"], default="gui",
                         help="运行模式: cli(命令行) 或 gui(图形界面) (默认: gui)")
@@ -251,6 +359,8 @@ def main():
                         help=f"无操作超时时间(分钟) (默认: {TIMEOUT_MINUTES}分钟)")
     parser.add_argument("--no-timeout", action="store_true",
                         help="禁用超时自动退出功能")
+    parser.add_argument("--cache", action="store_true",
+                        help="缓存脚本解析结果到磁盘（pickle格式，只读取当前用户独占的缓存文件）")
 
     args = parser.parse_args()
     print('ok')
@@ -265,7 +375,8 @@ def main():
         app = DSLApplication(
             script_path=args.script,
             llm_api_key=args.api_key,
-            timeout_minutes=timeout_minutes
+            timeout_minutes=timeout_minutes,
+            use_cache=args.cache
         )
 
         # 初始化组件
@@ -1,38 +1,110 @@
-from typing import Dict, List, Optional
+import os
+import re
+import stat
+import sys
+import copy
+import pickle
+import functools
+import hashlib
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional
+
+try:
+    # 可选依赖：pyahocorasick，用于一次扫描匹配所有关键词
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # 导入DSL模块
-from src.dsl.lexer import Lexer
-from src.dsl.parser import Parser
+from src.dsl.parser import parse_cached
 from src.dsl.runtime import RuntimeEnvironment
-from src.dsl.better_interpreter import Interpreter
+from src.dsl.better_interpreter import Interpreter, MAX_ITERATIONS
 from src.dsl.nodes import ScriptNode
 
 # 导入LLM模块
-from src.dsl.ai_client import IntentClassifier
+from src.dsl.ai_client import IntentClassifier, BatchedIntentClassifier
+
+# 从脚本源码中提取意图和标签信息的正则
+# intents块、labels块和if语句中的意图用一个正则一次扫描完成
+_DSL_INFO = re.compile(
+    r'intents\s*\{(?P<intents>[^}]+)\}'
+    r'|labels\s*\{(?P<labels>[^}]+)\}'
+    r'|if\s*\$intent\s*==\s*"(?P<if_intent>[^"]+)"\s*then'
+)
+_QUOTED = re.compile(r'"([^"]+)"')
+_IDENT = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*):?')
+
+# 解析结果缓存目录
+_CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'dsl'
+# 决定缓存内容（语法树结构、提取的意图和标签）的模块，其源码的哈希计入缓存键，修改后旧缓存自动失效
+_CACHE_SOURCES = ('lexer.py', 'parser.py', 'nodes.py', 'main_controller.py')
+
+# 结束对话的命令（已casefold，输入也需casefold后再比较）
+EXIT_COMMANDS = frozenset(command.casefold() for command in ('退出', 'exit', 'quit', 'bye'))
+
+
+def _owned_privately(st: os.stat_result) -> bool:
+    """文件或目录属于当前用户，且组和其他用户没有写权限
+
+    Windows 上没有uid，st_mode 也不反映ACL，只能依赖用户目录本身的权限
+    """
+    if not hasattr(os, 'getuid'):
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+@functools.lru_cache(maxsize=None)
+def _code_version() -> str:
+    """根据决定缓存内容的模块源码计算缓存版本"""
+    digest = hashlib.sha256()
+    base = Path(__file__).parent
+    for name in _CACHE_SOURCES:
+        digest.update((base / name).read_bytes())
+    return digest.hexdigest()
+
+
+@dataclass(slots=True, frozen=True)
+class Turn:
+    """对话历史中的一条记录"""
+    role: str  # 'user' 或 'bot'
+    message: str
+    timestamp: str
 
 
 class DSLController:
     """DSL脚本主控制器"""
 
-    def __init__(self, script_path: str, llm_api_key: Optional[str] = None):
+    def __init__(self, script_path: str, llm_api_key: Optional[str] = None, use_cache: bool = False,
+                 history_cap: int = 1000):
         """
         初始化主控制器
 
         Args:
             script_path: DSL脚本文件路径
             llm_api_key: DeepSeek API密钥
+            use_cache: 是否使用磁盘上缓存的脚本解析结果（默认关闭，命令行入口通过 --cache 开启）
+            history_cap: 对话历史最多保留的条数，超出时丢弃最早的记录
         """
         self.script_path = script_path
         self.llm_api_key = llm_api_key
+        self.use_cache = use_cache
+        self.history_cap = history_cap
 
         # 初始化组件
         self.script_ast: Optional[ScriptNode] = None
         self.runtime = RuntimeEnvironment()
         self.interpreter = Interpreter(self.runtime)
         self.llm_classifier: Optional[IntentClassifier] = None
+        # 并发对话共用的批量意图识别器
+        self.batched_classifier: Optional[BatchedIntentClassifier] = None
 
         # 对话历史
-        self.conversation_history: List[Dict] = []
+        self.conversation_history: Deque[Turn] = deque(maxlen=history_cap)
 
         # 从DSL脚本解析的意图列表
         self.dsl_intents: List[str] = []
@@ -41,17 +113,35 @@ class DSLController:
         self.parsed_labels: List[str] = []
         self.parsed_intents: List[str] = []
 
+        # 关键词映射（后备意图识别用），按生成时的意图列表缓存
+        self._keyword_mapping: Dict[str, tuple] = {}
+        self._keyword_mapping_intents: Optional[tuple] = None
+        self._keyword_priority: Dict[str, tuple] = {}  # 关键词 -> (意图在映射中的序号, 意图)
+        self._keyword_automaton = None  # 安装了pyahocorasick时使用的关键词自动机
+        self._keyword_pattern: Optional[re.Pattern] = None  # 未安装时使用的关键词正则
+
+        # 最近一次格式化的时间戳，同一轮对话的多条记录通常在同一秒内
+        self._timestamp_second = -1
+        self._timestamp_text = ""
+
+        # 脚本源码，初始化时只读取一次，供信息提取和解析共用
+        self._script_source: Optional[str] = None
+
     def initialize(self):
         """初始化系统"""
         print("🚀 正在初始化DSL聊天机器人系统...")
 
         try:
-            # 1. 首先提取DSL中的意图和标签
+            # 1. 读取脚本，源码未变时直接使用缓存的解析结果
             print(f"📄 解析脚本: {self.script_path}")
-            self._extract_dsl_info()
+            self._read_script()
+            if not self._load_cached_script():
+                # 提取DSL中的意图和标签
+                self._extract_dsl_info()
 
-            # 2. 加载并解析DSL脚本
-            self._load_and_parse_script()
+                # 2. 加载并解析DSL脚本
+                self._load_and_parse_script()
+                self._store_cached_script()
 
             # 3. 初始化LLM模块
             print("🤖 初始化LLM意图识别模块...")
@@ -65,6 +155,9 @@ class DSLController:
             print("⚙️ 设置初始变量...")
             self._set_initial_variables()
 
+            # 6. 预先生成后备方案用的关键词映射
+            self._get_keyword_mapping()
+
             print("✅ 系统初始化完成！")
             print(f"📋 DSL意图列表: {self.dsl_intents}")
             print("-" * 50)
@@ -73,77 +166,109 @@ class DSLController:
             print(f"❌ 初始化失败: {e}")
             raise
 
-    def _extract_dsl_info(self):
-        """从DSL脚本中提取意图和标签信息"""
+    def _read_script(self) -> str:
+        """读取脚本文件内容，只在第一次调用时读取文件"""
+        if self._script_source is None:
+            try:
+                with open(self.script_path, 'r', encoding='utf-8') as f:
+                    self._script_source = f.read()
+            except FileNotFoundError:
+                print(f"❌ 脚本文件不存在: {self.script_path}")
+                raise
+        return self._script_source
+
+    def _cache_path(self) -> Path:
+        """解析结果缓存文件路径，以代码版本和源码的sha256命名"""
+        digest = hashlib.sha256(f"{_code_version()}\n{self._read_script()}".encode('utf-8')).hexdigest()
+        return _CACHE_DIR / f"{digest}.pkl"
+
+    def _load_cached_script(self) -> bool:
+        """读取缓存的语法树、意图和标签，命中时返回True"""
+        if not self.use_cache:
+            return False
         try:
-            with open(self.script_path, 'r', encoding='utf-8') as f:
-                script_content = f.read()
+            path = self._cache_path()
+            with open(path, 'rb') as f:
+                # pickle.load 可以执行任意代码，只读取当前用户独占的目录中、当前用户独占的文件
+                if not (_owned_privately(os.stat(path.parent)) and _owned_privately(os.fstat(f.fileno()))):
+                    print(f"⚠️ 解析缓存不属于当前用户或可被他人写入，忽略: {path}")
+                    return False
+                self.script_ast, self.parsed_intents, self.parsed_labels = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"⚠️ 解析缓存读取失败，重新解析: {e}")
+            return False
 
-            # 提取意图定义
-            import re
+        print(f"✅ 使用缓存的解析结果，共 {len(self.script_ast.statements)} 条语句")
+        return True
 
-            # 查找intents定义
-            intent_pattern = r'intents\s*\{([^}]+)\}'
-            intent_match = re.search(intent_pattern, script_content)
+    def _store_cached_script(self):
+        """把语法树、意图和标签写入缓存（先写临时文件再替换，避免留下不完整的缓存）"""
+        if not self.use_cache:
+            return
+        try:
+            path = self._cache_path()
+            # 新建的缓存目录只允许当前用户访问；已存在的目录不属于当前用户时不写入（读取时同样会被拒绝）
+            path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            if not _owned_privately(os.stat(path.parent)):
+                print(f"⚠️ 缓存目录不属于当前用户或可被他人写入，不写入缓存: {path.parent}")
+                return
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((self.script_ast, self.parsed_intents, self.parsed_labels), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ 解析缓存写入失败: {e}")
 
-            if intent_match:
-                intent_str = intent_match.group(1)
+    def _extract_dsl_info(self):
+        """从DSL脚本中提取意图和标签信息（一次扫描源码）"""
+        try:
+            intent_str = None
+            label_str = None
+            if_intents = {}  # 按出现顺序去重
+
+            for match in _DSL_INFO.finditer(self._read_script()):
+                kind = match.lastgroup
+                if kind == 'intents':
+                    # 只使用第一个intents定义
+                    if intent_str is None:
+                        intent_str = match.group(kind)
+                elif kind == 'labels':
+                    if label_str is None:
+                        label_str = match.group(kind)
+                else:
+                    if_intents[match.group(kind)] = None
+
+            if intent_str is not None:
                 # 提取引号内的意图名称
-                intents = re.findall(r'"([^"]+)"', intent_str)
+                intents = _QUOTED.findall(intent_str)
                 self.parsed_intents = intents
                 print(f"📋 从DSL解析到的意图: {intents}")
 
-            # 查找labels定义
-            label_pattern = r'labels\s*\{([^}]+)\}'
-            label_match = re.search(label_pattern, script_content)
-
-            if label_match:
-                label_str = label_match.group(1)
+            if label_str is not None:
                 # 提取标签名称（去掉冒号）
-                labels = re.findall(r'([a-zA-Z_][a-zA-Z0-9_]*):?', label_str)
+                labels = _IDENT.findall(label_str)
                 self.parsed_labels = labels
                 print(f"🏷️  从DSL解析到的标签: {labels}")
 
-            # 如果没有明确的intents定义，则查找if语句中的意图
-            if not self.parsed_intents:
-                self._extract_intents_from_if_statements(script_content)
+            # 如果没有明确的intents定义，则使用if语句中的意图
+            if not self.parsed_intents and if_intents:
+                self.parsed_intents = list(if_intents)
+                print(f"📋 从if语句解析到的意图: {self.parsed_intents}")
 
         except Exception as e:
             print(f"⚠️ DSL信息提取失败: {e}")
 
-    def _extract_intents_from_if_statements(self, script_content: str):
-        """从if语句中提取意图名称"""
-        try:
-            # 查找所有if $intent == "xxx" then的语句
-            if_pattern = r'if\s*\$intent\s*==\s*"([^"]+)"\s*then'
-            if_matches = re.findall(if_pattern, script_content)
-
-            if if_matches:
-                self.parsed_intents = list(set(if_matches))  # 去重
-                print(f"📋 从if语句解析到的意图: {self.parsed_intents}")
-        except Exception as e:
-            print(f"⚠️ 从if语句提取意图失败: {e}")
-
     def _load_and_parse_script(self):
         """加载并解析DSL脚本"""
         try:
-            # 读取脚本文件
-            with open(self.script_path, 'r', encoding='utf-8') as f:
-                script_content = f.read()
-
-            # 词法分析
-            lexer = Lexer(script_content)
-            tokens = lexer.tokenize()
-
-            # 语法分析
-            parser = Parser(tokens)
-            self.script_ast = parser.parse()
+            # 词法和语法分析（使用初始化时读取的源码；同一进程内重新加载相同源码时复用语法树）
+            self.script_ast = parse_cached(self._read_script())
 
             print(f"✅ 脚本解析成功，共 {len(self.script_ast.statements)} 条语句")
 
-        except FileNotFoundError:
-            print(f"❌ 脚本文件不存在: {self.script_path}")
-            raise
         except Exception as e:
             print(f"❌ 脚本解析错误: {e}")
             raise
@@ -154,27 +279,25 @@ class DSLController:
             # 使用从DSL解析的意图列表
             self.dsl_intents = self.parsed_intents if self.parsed_intents else ["其他"]
 
-            self.llm_classifier = IntentClassifier(api_key="sk-5dd634970d3e447b99b7e9ad631a5e80")
+            self.llm_classifier = IntentClassifier(api_key=self.llm_api_key)
+            self.batched_classifier = BatchedIntentClassifier(self.llm_classifier)
             print("✅ LLM模块初始化成功")
         except Exception as e:
             print(f"⚠️ LLM模块初始化失败，将使用关键词匹配: {e}")
             self.llm_classifier = None
+            self.batched_classifier = None
 
 
     def _register_external_functions(self):
         """注册外部函数到解释器"""
 
-        def get_intent_function(user_input: str) -> str:
-            """意图识别函数"""
+        async def get_intent_function(user_input: str) -> str:
+            """意图识别函数（协程，由解释器等待结果）"""
             # 记录用户输入
-            self.conversation_history.append({
-                'role': 'user',
-                'message': user_input,
-                'timestamp': self._get_timestamp()
-            })
-
-            # 使用LLM识别意图
-            if self.llm_classifier:
+            self.conversation_history.append(Turn('user', user_input, self._get_timestamp()))
+
+            # 使用LLM识别意图（经批量识别器提交，并发对话的请求会合并为一次API调用）
+            if self.batched_classifier:
                 try:
                     # 使用DSL中定义的意图列表
                     if not self.dsl_intents:
@@ -182,8 +305,7 @@ class DSLController:
                         self.dsl_intents = self.parsed_intents if self.parsed_intents else ["其他"]
 
                     # 调用LLM进行意图识别
-                    print(user_input, self.dsl_intents)
-                    intent = self.llm_classifier.get_intent(
+                    intent = await self.batched_classifier.get_intent(
                         user_input,
                         self.dsl_intents
                     )
@@ -204,19 +326,72 @@ class DSLController:
 
     def _keyword_based_intent(self, user_input: str) -> str:
         """基于关键词的意图识别（后备方案）"""
-        # 创建简化的关键词映射（如果需要）
-        keyword_mapping = self._create_keyword_mapping()
-
-        for intent, keywords in keyword_mapping.items():
-            if any(keyword in user_input for keyword in keywords):
-                print(f"🔍 关键词匹配意图: {intent}")
-                return intent
+        self._get_keyword_mapping()
+        # 一次扫描找出所有命中的关键词，取映射中最靠前的意图（与逐个意图匹配的结果一致）
+        if self._keyword_automaton is not None:
+            hits = (value for _, value in self._keyword_automaton.iter(user_input))
+        elif self._keyword_pattern is not None:
+            priority = self._keyword_priority
+            hits = (priority[match.group(1)] for match in self._keyword_pattern.finditer(user_input))
+        else:
+            hits = ()
+        matched = min(hits, default=None)
+        if matched is not None:
+            intent = matched[1]
+            print(f"🔍 关键词匹配意图: {intent}")
+            return intent
 
         # 返回DSL中的第一个意图或"其他"
         default_intent = self.dsl_intents[0] if self.dsl_intents else "其他"
         print(f"❓ 未匹配到意图，使用默认: {default_intent}")
         return default_intent
 
+    def _get_keyword_mapping(self) -> Dict[str, tuple]:
+        """获取关键词映射，只在意图列表变化时重新生成"""
+        intents = tuple(self.dsl_intents)
+        if intents != self._keyword_mapping_intents:
+            self._keyword_mapping = {intent: tuple(keywords)
+                                     for intent, keywords in self._create_keyword_mapping().items()}
+            self._keyword_mapping_intents = intents
+            self._keyword_priority = self._keyword_priorities(self._keyword_mapping)
+            self._keyword_automaton = self._build_keyword_automaton(self._keyword_priority)
+            self._keyword_pattern = (None if self._keyword_automaton is not None
+                                     else self._build_keyword_pattern(self._keyword_priority))
+        return self._keyword_mapping
+
+    @staticmethod
+    def _keyword_priorities(keyword_mapping: Dict[str, tuple]) -> Dict[str, tuple]:
+        """关键词 -> (意图在映射中的序号, 意图)，同一关键词属于多个意图时保留最靠前的"""
+        priority = {}
+        for index, (intent, keywords) in enumerate(keyword_mapping.items()):
+            for keyword in keywords:
+                if keyword:
+                    priority.setdefault(keyword, (index, intent))
+        return priority
+
+    @staticmethod
+    def _build_keyword_automaton(keyword_priority: Dict[str, tuple]):
+        """用所有关键词构建Aho-Corasick自动机，未安装pyahocorasick时返回None"""
+        if ahocorasick is None or not keyword_priority:
+            return None
+
+        automaton = ahocorasick.Automaton()
+        for keyword, value in keyword_priority.items():
+            automaton.add_word(keyword, value)
+        automaton.make_automaton()
+        return automaton
+
+    @staticmethod
+    def _build_keyword_pattern(keyword_priority: Dict[str, tuple]) -> Optional[re.Pattern]:
+        """把所有关键词按优先级编译成一个正则，没有关键词时返回None
+
+        用零宽先行断言在每个位置尝试匹配，分支按优先级排列，
+        因此每个位置取到的是从该位置开始的最优先关键词，所有位置中的最小值即整体最优先的命中
+        """
+        if not keyword_priority:
+            return None
+        return re.compile("(?=(" + "|".join(map(re.escape, keyword_priority)) + "))")
+
     def _create_keyword_mapping(self) -> Dict[str, List[str]]:
         """根据DSL意图创建关键词映射"""
         # 这里可以根据DSL意图名称自动生成一些关键词
@@ -239,27 +414,31 @@ class DSLController:
             if "退出" in intent:
                 keywords.extend(["离开", "结束", "关闭", "退出"])
 
-            mapping[intent] = list(set(keywords))  # 去重
+            mapping[intent] = list(dict.fromkeys(keywords))  # 按顺序去重
 
         return mapping
 
     def _set_initial_variables(self):
         """设置初始变量"""
-        # 设置系统变量
-        self.runtime.set_variable("$bot_name", "DSL聊天助手")
-        self.runtime.set_variable("$welcome_message", "您好！我是聊天助手，请问有什么可以帮助您？")
-        self.runtime.set_variable("$user_input", "")
-        self.runtime.set_variable("$intent", "")
-
-        # 设置DSL意图列表
-        self.runtime.set_variable("$dsl_intents", self.dsl_intents)
+        self.runtime.update_variables({
+            # 系统变量
+            "$bot_name": "DSL聊天助手",
+            "$welcome_message": "您好！我是聊天助手，请问有什么可以帮助您？",
+            "$user_input": "",
+            "$intent": "",
+            # DSL意图列表
+            "$dsl_intents": self.dsl_intents,
+        })
 
         print("✅ 初始变量设置完成")
 
     def _get_timestamp(self) -> str:
-        """获取当前时间戳"""
-        from datetime import datetime
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        """获取当前时间戳（精确到秒，同一秒内复用已格式化的字符串）"""
+        now = int(time.time())
+        if now != self._timestamp_second:
+            self._timestamp_second = now
+            self._timestamp_text = datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S")
+        return self._timestamp_text
 
     def start_interaction(self):
         """开始用户交互"""
@@ -283,7 +462,7 @@ class DSLController:
                     continue
 
                 # 检查退出命令
-                if user_input.lower() in ['退出', 'exit', 'quit', 'bye']:
+                if user_input.casefold() in EXIT_COMMANDS:
                     print("\n👋 感谢使用，再见！")
                     break
 
@@ -294,8 +473,9 @@ class DSLController:
                 replies = self._execute_script()
 
                 # 输出所有回复
-                for reply in replies:
-                    print(f"🤖 机器人: {reply}")
+                if replies:
+                    sys.stdout.write("".join(f"🤖 机器人: {reply}\n" for reply in replies))
+                    sys.stdout.flush()
 
             except KeyboardInterrupt:
                 print("\n\n👋 用户中断，退出系统")
@@ -304,54 +484,15 @@ class DSLController:
                 print(f"❌ 系统错误: {e}")
                 print("💡 您可以继续输入或输入'退出'结束对话")
 
+    def execute_with_input_stream(self, user_input: str) -> Iterator[str]:
+        """设置用户输入并执行脚本，逐条产出回复，调用方可以边执行边显示"""
+        self.runtime.set_variable("$user_input", user_input)
+        return self._execute_script_iter()
+
     def _execute_script(self) -> List[str]:
         """执行DSL脚本并返回回复列表"""
         try:
-            if not self.script_ast:
-                raise ValueError("脚本未初始化")
-            #新增
-            # 设置当前脚本
-            self.runtime.current_script = self.script_ast
-
-            # 在执行前确保标签已扫描
-            if not self.interpreter._label_cache:
-                print("🔍 扫描标签定义...")
-                self.interpreter._scan_labels(self.script_ast)
-
-            # 执行脚本
-            # replies = self.interpreter.execute_script(self.script_ast)
-            # print("!!!!!\n\n\n",replies)
-            replies = []
-
-            # 重置暂停状态
-            self.interpreter.resume_execution()
-
-            # 逐步执行脚本，遇到暂停指令就停止
-            while (self.runtime.current_line < len(self.script_ast.statements) and
-                   not self.runtime.should_exit):
-
-                # 执行单条指令
-                result = self.interpreter.execute_script_step(self.script_ast)
-
-                # 如果有回复，添加到列表
-                if result:
-                    replies.append(result)
-
-                # 如果执行暂停，停止继续执行
-                if self.interpreter.is_execution_paused():
-                    pause_reason = self.interpreter.get_pause_reason()
-                    print(f"⏸️ 执行暂停，原因: {pause_reason}")
-                    break
-
-            # 记录机器人回复
-            for reply in replies:
-                self.conversation_history.append({
-                    'role': 'bot',
-                    'message': reply,
-                    'timestamp': self._get_timestamp()
-                })
-
-            return replies
+            return list(self._execute_script_iter())
 
         except Exception as e:
             print(f"❌ 脚本执行错误: {e}")
@@ -360,9 +501,152 @@ class DSLController:
             traceback.print_exc()
             return ["抱歉，系统出现错误，请稍后再试。"]
 
-    def get_conversation_history(self) -> List[Dict]:
-        """获取对话历史"""
-        return self.conversation_history
+    def _prepare_execution(self):
+        """执行前的准备：设置当前脚本、确保已编译并清除暂停状态"""
+        if not self.script_ast:
+            raise ValueError("脚本未初始化")
+        #新增
+        # 设置当前脚本
+        self.runtime.current_script = self.script_ast
+
+        # 在执行前确保当前脚本已扫描标签并编译（没有标签的脚本也只编译一次）
+        if self.interpreter._compiled_for is not self.script_ast:
+            print("🔍 扫描标签定义...")
+            self.interpreter._scan_labels(self.script_ast)
+            self.interpreter._compile(self.script_ast)
+
+        # 重置暂停状态
+        self.interpreter.resume_execution()
+
+    def _record_reply(self, reply: str):
+        """记录机器人回复到对话历史"""
+        self.conversation_history.append(Turn('bot', reply, self._get_timestamp()))
+
+    def _report_pause(self):
+        """输出执行暂停的原因"""
+        pause_reason = self.interpreter.get_pause_reason()
+        print(f"⏸️ 执行暂停，原因: {pause_reason}")
+
+    @staticmethod
+    def _count_block(block_count: int) -> int:
+        """累计本轮执行的基本块数，超过上限时抛出异常"""
+        if block_count >= MAX_ITERATIONS:
+            raise RuntimeError(f"可能检测到无限循环：本轮执行超过{MAX_ITERATIONS}个基本块")
+        return block_count + 1
+
+    def _execute_script_iter(self) -> Iterator[str]:
+        """执行DSL脚本，每产生一条回复就立即产出"""
+        self._prepare_execution()
+
+        # 循环中反复用到的属性放到局部变量里，语句数在执行期间不变
+        runtime = self.runtime
+        interpreter = self.interpreter
+        script = self.script_ast
+        statement_count = interpreter.get_statement_count()
+
+        # 逐步执行脚本，遇到暂停指令就停止；一轮执行的基本块数超过上限时视为死循环
+        block_count = 0
+        while runtime.current_line < statement_count and not runtime.should_exit:
+            block_count = self._count_block(block_count)
+
+            # 执行一个基本块（连续的回复和赋值，以及结尾的一条交互指令）
+            for reply in interpreter.execute_script_block(script):
+                self._record_reply(reply)
+                yield reply
+
+            # 如果执行暂停，停止继续执行
+            if interpreter.is_execution_paused():
+                self._report_pause()
+                break
+
+    async def _execute_script_async(self) -> List[str]:
+        """_execute_script_iter 的协程版本，意图识别时让出事件循环"""
+        self._prepare_execution()
+
+        runtime = self.runtime
+        interpreter = self.interpreter
+        script = self.script_ast
+        statement_count = interpreter.get_statement_count()
+
+        replies = []
+        block_count = 0
+        while runtime.current_line < statement_count and not runtime.should_exit:
+            block_count = self._count_block(block_count)
+            for reply in await interpreter.execute_script_block_async(script):
+                self._record_reply(reply)
+                replies.append(reply)
+            if interpreter.is_execution_paused():
+                self._report_pause()
+                break
+        return replies
+
+    async def execute_with_input_async(self, user_input: Optional[str] = None) -> List[str]:
+        """设置用户输入并执行脚本（协程版本），多个对话可以在同一个事件循环上并发执行
+
+        user_input 为 None 时不修改输入变量，只继续执行脚本（如对话开场）
+        """
+        if user_input is not None:
+            self.runtime.set_variable("$user_input", user_input)
+        try:
+            return await self._execute_script_async()
+        except Exception as e:
+            print(f"❌ 脚本执行错误: {e}")
+            return ["抱歉，系统出现错误，请稍后再试。"]
+
+    def new_session(self) -> 'DSLController':
+        """创建一个新对话：运行时、解释器和对话历史相互独立
+
+        新对话是当前控制器的浅拷贝，以下可变状态仍与当前控制器及其他对话共用：
+        已解析的脚本、dsl_intents 列表、关键词映射表、llm_classifier（含其识别结果缓存）
+        和 batched_classifier。这些状态在初始化后不应再修改，否则会影响所有对话
+        """
+        session = copy.copy(self)
+        session.runtime = RuntimeEnvironment()
+        session.interpreter = Interpreter(session.runtime)
+        session.conversation_history = deque(maxlen=self.history_cap)
+        session._register_external_functions()
+        session._set_initial_variables()
+        return session
+
+    async def run_many(self, inputs: List[str], concurrency_limit: int = 8) -> List[List[str]]:
+        """
+        在同一个事件循环上并发执行多个对话，每条输入对应一个独立的新对话
+
+        Args:
+            inputs: 各对话的用户输入
+            concurrency_limit: 同时进行的对话数上限，避免超出API速率限制
+
+        Returns:
+            与inputs顺序一致的回复列表，每项包含该对话的开场回复和对这条输入的回复
+        """
+        semaphore = asyncio.Semaphore(concurrency_limit)
+
+        async def run_one(user_input: str) -> List[str]:
+            async with semaphore:
+                session = self.new_session()
+                # 先执行到脚本第一次等待输入，再送入用户输入
+                replies = await session.execute_with_input_async()
+                replies.extend(await session.execute_with_input_async(user_input))
+                return replies
+
+        try:
+            return list(await asyncio.gather(*(run_one(user_input) for user_input in inputs)))
+        finally:
+            # 本次调用创建的连接池随调用结束关闭，之后再识别时重新创建
+            await self.aclose()
+
+    def close(self):
+        """释放解释器同步执行脚本时使用的事件循环（先关闭其上的LLM异步客户端），需在执行脚本的线程中调用"""
+        self.interpreter.close(self.llm_classifier.aclose if self.llm_classifier else None)
+
+    async def aclose(self):
+        """关闭LLM模块在当前事件循环上的异步客户端，在事件循环结束前调用"""
+        if self.llm_classifier:
+            await self.llm_classifier.aclose()
+
+    def get_conversation_history(self) -> List[Turn]:
+        """获取对话历史（副本，GUI的工作线程可能同时追加记录）"""
+        return list(self.conversation_history)
 
     def reset_conversation(self):
         """重置对话"""
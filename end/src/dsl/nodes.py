@@ -1,9 +1,12 @@
+import weakref
 from abc import ABC, abstractmethod
-from typing import List, Any
+from typing import List, Any, Optional, Sequence, Tuple
 
 
 # AST节点的基类
 class ASTNode(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def __repr__(self) -> str:
         pass
@@ -11,8 +14,13 @@ class ASTNode(ABC):
 
 # 整个脚本的根节点
 class ScriptNode(ASTNode):
-    def __init__(self, statements: List[ASTNode]):
-        self.statements = statements
+    __slots__ = ('statements', '_labels', '_intents')
+
+    def __init__(self, statements: Sequence[ASTNode]):
+        # 解析完成后语句不再变化，存为元组
+        self.statements: Tuple[ASTNode, ...] = tuple(statements)
+        self._labels = None  # 解释器缓存的标签位置
+        self._intents = None  # 解释器缓存的意图列表
 
     def __repr__(self) -> str:
         return f"Script({len(self.statements)} statements)"
@@ -26,9 +34,32 @@ class ScriptNode(ASTNode):
 #     def __repr__(self) -> str:
 #         return f"Label({self.name})"
 class LabelNode(ASTNode):
+    """标签节点：同名同类的标签共用一个实例，创建后不可修改属性"""
+    __slots__ = ('name', 'is_definition', '__weakref__')
+
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name: str, is_definition: bool = False):
+        key = (name, is_definition)
+        node = cls._instances.get(key)
+        if node is None:
+            node = super().__new__(cls)
+            # 只在第一次创建时写入属性，之后取到的共用实例保持不变
+            object.__setattr__(node, 'name', name)
+            object.__setattr__(node, 'is_definition', is_definition)  # 新增：是否是定义
+            cls._instances[key] = node
+        return node
+
+    def __reduce__(self):
+        # 反序列化时同样经过 __new__，从磁盘缓存读出的标签也能共用实例
+        return self.__class__, (self.name, self.is_definition)
+
     def __init__(self, name: str, is_definition: bool = False):
-        self.name = name
-        self.is_definition = is_definition  # 新增：是否是定义
+        # 属性已在 __new__ 中写入
+        pass
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"标签节点为共用实例，不能修改属性: {key}")
 
     def __repr__(self) -> str:
         prefix = "@" if self.is_definition else ""
@@ -37,6 +68,8 @@ class LabelNode(ASTNode):
 
 # 回复指令节点，如: reply "Hello"
 class ReplyNode(ASTNode):
+    __slots__ = ('message',)
+
     def __init__(self, message: str):
         self.message = message
 
@@ -46,6 +79,8 @@ class ReplyNode(ASTNode):
 
 # 设置变量指令节点，如: set $intent = "query_product"
 class SetNode(ASTNode):
+    __slots__ = ('var_name', 'value')
+
     def __init__(self, var_name: str, value: Any):
         self.var_name = var_name
         self.value = value
@@ -56,6 +91,8 @@ class SetNode(ASTNode):
 
 # 获取意图指令节点，如: get_intent $user_input
 class GetIntentNode(ASTNode):
+    __slots__ = ('var_name',)
+
     def __init__(self, var_name: str):
         self.var_name = var_name
 
@@ -65,6 +102,8 @@ class GetIntentNode(ASTNode):
 
 # 条件跳转节点，如: if $intent == "add_to_cart" then goto add_item
 class IfNode(ASTNode):
+    __slots__ = ('var_name', 'compare_value', 'target_label')
+
     def __init__(self, var_name: str, compare_value: str, target_label: str):
         self.var_name = var_name
         self.compare_value = compare_value
@@ -76,6 +115,8 @@ class IfNode(ASTNode):
 
 # 无条件跳转节点，如: goto main_loop
 class GotoNode(ASTNode):
+    __slots__ = ('target_label',)
+
     def __init__(self, target_label: str):
         self.target_label = target_label
 
@@ -85,11 +126,15 @@ class GotoNode(ASTNode):
 
 # 退出指令节点
 class ExitNode(ASTNode):
+    __slots__ = ()
+
     def __repr__(self) -> str:
         return "Exit()"
 
 # 意图定义节点
 class IntentsNode(ASTNode):
+    __slots__ = ('intent_names',)
+
     def __init__(self, intent_names: List[str]):
         self.intent_names = intent_names
 
@@ -97,6 +142,8 @@ class IntentsNode(ASTNode):
         return f"Intents({self.intent_names})"
 
 class LabelDeclarationsNode(ASTNode):
+    __slots__ = ('label_names',)
+
     def __init__(self, label_names: List[str]):
         self.label_names = label_names
 
@@ -106,6 +153,7 @@ class LabelDeclarationsNode(ASTNode):
 
 class PauseForInputNode(ASTNode):
     """暂停等待用户输入节点"""
+    __slots__ = ()
 
     def __init__(self):
         super().__init__()
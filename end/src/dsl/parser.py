@@ -1,51 +1,77 @@
-from typing import List
-from src.dsl.lexer import Token, TokenType, Lexer
+import sys
+import functools
+from typing import List, Sequence
+from src.dsl.lexer import Token, TokenType, Lexer, tokenize_cached
 from src.dsl.nodes import *
 
 
 class Parser:
-    def __init__(self, tokens: List[Token]):
+    __slots__ = ('tokens', 'current_token_index', 'current_token', '_dispatch')
+
+    def __init__(self, tokens: Sequence[Token]):
         self.tokens = tokens
         self.current_token_index = 0
         self.current_token = tokens[0] if tokens else None
 
-    def eat(self, token_type: str) -> Token:
+        # 语句首个token类型 -> 解析方法
+        self._dispatch = {
+            TokenType.LABEL: self.parse_label,
+            TokenType.INTENTS: self.parse_intents,
+            TokenType.REPLY: self.parse_reply,
+            TokenType.SET: self.parse_set,
+            TokenType.GET_INTENT: self.parse_get_intent,
+            TokenType.IF: self.parse_if,
+            TokenType.GOTO: self.parse_goto,
+            TokenType.EXIT: self.parse_exit,
+            TokenType.PAUSE_FOR_INPUT: self.parse_pause_for_input,
+        }
+
+    def eat(self, token_type: TokenType) -> Token:
         """消费当前token，并移动到下一个token"""
-        if self.current_token.type == token_type:
-            token = self.current_token
-            self.current_token_index += 1
-            if self.current_token_index < len(self.tokens):
-                self.current_token = self.tokens[self.current_token_index]
-            else:
-                self.current_token = None
-            return token
-        else:
-            raise SyntaxError(f"Expected {token_type}, got {self.current_token.type} at line {self.current_token.line}")
+        token = self.current_token
+        if token.type != token_type:
+            raise SyntaxError(f"Expected {token_type.name}, got {token.type.name} at line {token.line}")
+        tokens = self.tokens
+        index = self.current_token_index + 1
+        self.current_token_index = index
+        self.current_token = tokens[index] if index < len(tokens) else None
+        return token
 
     def parse(self) -> ScriptNode:
         """解析整个脚本"""
         statements = []
         # 解析可选的标签声明
-        print(self.current_token.line)
         if self.current_token and self.current_token.type == TokenType.LABELS:
             label_decl = self.parse_label_declarations()
 
             if label_decl:
                 statements.append(label_decl)
 
-        while self.current_token and self.current_token.type != TokenType.EOF:
-            # 跳过空行
-            if self.current_token.type == TokenType.NEWLINE:
-                self.eat(TokenType.NEWLINE)
+        # 主循环中频繁使用的属性和常量放到局部变量里
+        tokens = self.tokens
+        token_count = len(tokens)
+        dispatch = self._dispatch
+        append = statements.append
+        NEWLINE, EOF = TokenType.NEWLINE, TokenType.EOF
+
+        token = self.current_token
+        while token and token.type != EOF:
+            # 跳过空行（直接移动下标，不经过eat）
+            if token.type == NEWLINE:
+                index = self.current_token_index + 1
+                self.current_token_index = index
+                token = self.current_token = tokens[index] if index < token_count else None
                 continue
 
-            statement = self.parse_statement()
+            parse_method = dispatch.get(token.type)
+            if parse_method is None:
+                raise SyntaxError(f"Unexpected token {token.type.name} at line {token.line}")
+            statement = parse_method()
             if statement:
-                statements.append(statement)
+                append(statement)
 
-            # 跳过行尾的换行
-            if self.current_token and self.current_token.type == TokenType.NEWLINE:
-                self.eat(TokenType.NEWLINE)
+            # 行尾的换行留给下一轮循环跳过
+            token = self.current_token
 
         return ScriptNode(statements)
 
@@ -54,26 +80,10 @@ class Parser:
         if not self.current_token:
             return None
 
-        if self.current_token.type == TokenType.LABEL:
-            return self.parse_label()
-        elif self.current_token.type == TokenType.INTENTS:
-            return self.parse_intents()
-        elif self.current_token.type == TokenType.REPLY:
-            return self.parse_reply()
-        elif self.current_token.type == TokenType.SET:
-            return self.parse_set()
-        elif self.current_token.type == TokenType.GET_INTENT:
-            return self.parse_get_intent()
-        elif self.current_token.type == TokenType.IF:
-            return self.parse_if()
-        elif self.current_token.type == TokenType.GOTO:
-            return self.parse_goto()
-        elif self.current_token.type == TokenType.EXIT:
-            return self.parse_exit()
-        elif self.current_token.type == TokenType.PAUSE_FOR_INPUT:
-            return self.parse_pause_for_input()
-        else:
-            raise SyntaxError(f"Unexpected token {self.current_token.type} at line {self.current_token.line}")
+        parse_method = self._dispatch.get(self.current_token.type)
+        if parse_method is None:
+            raise SyntaxError(f"Unexpected token {self.current_token.type.name} at line {self.current_token.line}")
+        return parse_method()
 
     def parse_label(self) -> LabelNode:
         """解析标签定义，如: main_loop:"""
@@ -86,12 +96,8 @@ class Parser:
             has_at_symbol = True
 
         token = self.eat(TokenType.LABEL)
-        label_node = LabelNode(token.value)
-
-        # 可以添加一个属性标记这是定义（而不是引用）
-        label_node.is_definition = has_at_symbol
-
-        return label_node
+        # 标签节点是共用的实例，定义标记（而不是引用）在构造时传入
+        return LabelNode(token.value, is_definition=has_at_symbol)
 
     def parse_intents(self) -> IntentsNode:
         """解析意图定义语句，如: intents {"greeting", "query_product"}"""
@@ -102,7 +108,7 @@ class Parser:
         while self.current_token and self.current_token.type == TokenType.STRING:
             # 解析第一个意图
             string_token = self.eat(TokenType.STRING)
-            intent_names.append(string_token.value)
+            intent_names.append(sys.intern(string_token.value))
 
             # 如果有逗号，继续解析更多意图
             if self.current_token and self.current_token.type == TokenType.COMMA:
@@ -128,20 +134,20 @@ class Parser:
         # 值可以是字符串或变量
         if self.current_token.type == TokenType.STRING:
             value_token = self.eat(TokenType.STRING)
-            value = value_token.value
+            value = sys.intern(value_token.value)
         elif self.current_token.type == TokenType.VARIABLE:
             value_token = self.eat(TokenType.VARIABLE)
-            value = value_token.value
+            value = sys.intern(value_token.value)
         else:
             raise SyntaxError(f"Expected string or variable after = at line {self.current_token.line}")
 
-        return SetNode(var_token.value, value)
+        return SetNode(sys.intern(var_token.value), value)
 
     def parse_get_intent(self) -> GetIntentNode:
         """解析获取意图语句，如: get_intent $user_input"""
         self.eat(TokenType.GET_INTENT)
         var_token = self.eat(TokenType.VARIABLE)
-        return GetIntentNode(var_token.value)
+        return GetIntentNode(sys.intern(var_token.value))
 
     def parse_if(self) -> IfNode:
         """解析条件语句，如: if $intent == "value" then goto label"""
@@ -153,7 +159,8 @@ class Parser:
         self.eat(TokenType.GOTO)
         label_token = self.eat(TokenType.LABEL)
 
-        return IfNode(var_token.value, string_token.value, label_token.value)
+        # 比较用的字符串常量驻留，与同样驻留的意图判等时只需比较对象身份
+        return IfNode(sys.intern(var_token.value), sys.intern(string_token.value), label_token.value)
 
     def parse_goto(self) -> GotoNode:
         """解析跳转语句，如: goto label"""
@@ -182,11 +189,20 @@ class Parser:
                 self.eat(TokenType.COMMA)
             else:
                 break
-        print(self.current_token.type)
         self.eat(TokenType.RBRACE)
         return LabelDeclarationsNode(label_names)
 
     def parse_pause_for_input(self) -> PauseForInputNode:
         """解析暂停等待用户输入语句"""
         self.eat(TokenType.PAUSE_FOR_INPUT)
-        return PauseForInputNode()
\ No newline at end of file
+        return PauseForInputNode()
+
+
+@functools.lru_cache(maxsize=128)
+def parse_cached(source: str) -> ScriptNode:
+    """词法+语法分析源码，相同的源码直接返回缓存的语法树
+
+    返回的语法树被所有调用方共用，不要修改（解释器编译时只在 ScriptNode 上缓存由语句推导出的标签和意图，
+    跳转目标保存在各解释器自己的跳转表中）；需要时可调用 parse_cached.cache_clear() 清空缓存
+    """
+    return Parser(tokenize_cached(source)).parse()
@@ -1,11 +1,60 @@
-from typing import Dict, Any, Optional ,List
+import sys
+from collections.abc import MutableMapping
+from typing import Dict, Any, Optional ,List, Tuple, Iterable
+
+# 变量槽尚未赋值的标记
+UNSET = object()
+
+
+class VariableView(MutableMapping):
+    """runtime.variables 返回的变量视图：读写直接作用于变量槽，写入等同于 set_variable
+
+    遍历时变量名不含$前缀，读写时带不带$均可
+    """
+    __slots__ = ('_runtime',)
+
+    def __init__(self, runtime: 'RuntimeEnvironment'):
+        self._runtime = runtime
+
+    def __getitem__(self, name: str) -> Any:
+        value = self._runtime.get_variable(name, UNSET)
+        if value is UNSET:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name: str, value: Any):
+        self._runtime.set_variable(name, value)
+
+    def __delitem__(self, name: str):
+        runtime = self._runtime
+        slot = runtime._slot_ids.get(name)
+        if slot is None or runtime.var_slots[slot] is UNSET:
+            raise KeyError(name)
+        runtime.var_slots[slot] = UNSET
+
+    def __iter__(self):
+        slots = self._runtime.var_slots
+        return iter([name for name, slot in self._runtime._slot_ids.items()
+                     if slots[slot] is not UNSET and not name.startswith('$')])
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
 
 class RuntimeEnvironment:
     """运行时环境：为DSL脚本执行提供'内存'"""
+    __slots__ = ('_slot_ids', 'var_slots', '_variable_view', 'labels', 'current_line', 'should_exit',
+                 'last_reply', 'defined_intents', 'defined_intent_set', 'current_script')
 
     def __init__(self):
-        # 变量存储：存储脚本中定义的所有变量
-        self.variables: Dict[str, Any] = {}
+        # 变量存储：每个变量分配一个槽位下标，值按下标存放在列表中
+        # 带$和不带$的两种写法都登记在槽位表中，查找时无需去掉前缀
+        self._slot_ids: Dict[str, int] = {}
+        self.var_slots: List[Any] = []
+        self._variable_view = VariableView(self)
         # 标签表：存储标签名到语句索引的映射
         self.labels: Dict[str, int] = {}
         # 当前执行位置
@@ -15,30 +64,66 @@ class RuntimeEnvironment:
         # 用于存储临时的回复消息
         self.last_reply: Optional[str] = None
         # 意图定义存储
-        self.defined_intents: List[str] = []
+        self.defined_intents: Tuple[str, ...] = ()  # 只读，修改需重新调用 set_defined_intents
+        self.defined_intent_set: frozenset = frozenset()  # 用于O(1)判断意图是否已定义
         # 添加对当前脚本的引用
         self.current_script = None
 
-    def set_defined_intents(self, intents: List[str]):
+    def set_defined_intents(self, intents: Iterable[str]):
         """设置定义的意图列表"""
-        self.defined_intents = intents
+        self.defined_intents = tuple(intents)
+        self.defined_intent_set = frozenset(self.defined_intents)
+
+    def get_defined_intents(self) -> Tuple[str, ...]:
+        """获取定义的意图列表（元组不可修改，无需复制）"""
+        return self.defined_intents
+
+    def is_defined_intent(self, name: str) -> bool:
+        """判断意图是否在脚本中定义过"""
+        return name in self.defined_intent_set
 
-    def get_defined_intents(self) -> List[str]:
-        """获取定义的意图列表"""
-        return self.defined_intents.copy()  # 返回副本避免外部修改
+    @property
+    def variables(self) -> VariableView:
+        """已赋值的变量（变量名不含$前缀）；通过它赋值、update 或删除都会写入变量槽"""
+        return self._variable_view
+
+    def intern(self, name: str) -> int:
+        """返回变量的槽位下标，首次出现的变量名分配新槽位"""
+        slot = self._slot_ids.get(name)
+        if slot is None:
+            bare = name[1:] if name.startswith('$') else name
+            slot = len(self.var_slots)
+            self.var_slots.append(UNSET)
+            # 键名驻留，与解析器中同样驻留的变量名查找时可直接比较对象身份
+            self._slot_ids[sys.intern(bare)] = self._slot_ids[sys.intern('$' + bare)] = slot
+        return slot
+
+    def set_slot(self, slot: int, value: Any):
+        """按槽位下标设置变量值"""
+        self.var_slots[slot] = value
+
+    def get_slot(self, slot: int) -> Any:
+        """按槽位下标获取变量值，未赋值时为 UNSET"""
+        return self.var_slots[slot]
 
     def set_variable(self, name: str, value: Any):
-        """设置变量值"""
-        # 去掉变量名的$前缀（如果存在）
-        if name.startswith('$'):
-            name = name[1:]
-        self.variables[name] = value
+        """设置变量值（按变量名，供动态变量名使用）"""
+        self.var_slots[self.intern(name)] = value
+
+    def update_variables(self, mapping: Dict[str, Any]):
+        """批量设置变量值（变量名带不带$前缀均可）"""
+        slots = self.var_slots
+        intern = self.intern
+        for name, value in mapping.items():
+            slots[intern(name)] = value
 
     def get_variable(self, name: str, default: Any = None) -> Any:
-        """获取变量值"""
-        if name.startswith('$'):
-            name = name[1:]
-        return self.variables.get(name, default)
+        """获取变量值（按变量名，供动态变量名使用）"""
+        slot = self._slot_ids.get(name)
+        if slot is None:
+            return default
+        value = self.var_slots[slot]
+        return default if value is UNSET else value
 
     def register_label(self, label_name: str, line_number: int):
         """注册标签位置"""
@@ -63,7 +148,8 @@ class RuntimeEnvironment:
 
     def reset(self):
         """重置运行时环境"""
-        self.variables.clear()
+        # 原地清空，槽位分配保留给下一轮执行
+        self.var_slots[:] = [UNSET] * len(self.var_slots)
         self.labels.clear()
         self.current_line = 0
         self.should_exit = False
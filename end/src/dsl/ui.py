@@ -1,25 +1,31 @@
 import os
 import sys
-from typing import Optional
+from typing import Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import scrolledtext, ttk, messagebox
-from datetime import datetime
+import time
 
 # 导入主控制器
-from src.dsl.main_controller import DSLController
+from src.dsl.main_controller import DSLController, EXIT_COMMANDS
 
 
 class ChatbotGUI:
     """聊天机器人图形用户界面"""
 
-    def __init__(self, script_path: str, llm_api_key: Optional[str] = None):
+    def __init__(self, script_path: str, llm_api_key: Optional[str] = None, use_cache: bool = False):
         self.root = tk.Tk()
         self.root.title("🤖 DSL聊天机器人")
         self.root.geometry("800x600")
 
         self.script_path = script_path
         self.llm_api_key = llm_api_key
+        self.use_cache = use_cache
         self.controller: Optional[DSLController] = None
+        # 执行脚本（含LLM意图识别）的工作线程，只有一个线程，保证各轮对话按顺序执行
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        # 对话清空或系统重置时递增，用于丢弃之前提交的对话结果
+        self._generation = 0
 
         # 设置样式
         self.setup_styles()
@@ -90,6 +96,19 @@ class ChatbotGUI:
         )
         self.chat_display.pack(fill=tk.BOTH, expand=True)
 
+        # 消息标签样式只配置一次
+        for tag_name, bg_color in (("bot", self.bot_color), ("user", self.user_color)):
+            self.chat_display.tag_config(tag_name,
+                                         background=bg_color,
+                                         relief=tk.RIDGE,
+                                         borderwidth=1,
+                                         lmargin1=10,
+                                         lmargin2=10,
+                                         rmargin=10,
+                                         spacing1=5,
+                                         spacing3=5
+                                         )
+
         # 输入区域
         input_frame = tk.Frame(self.root, bg=self.bg_color)
         input_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
@@ -161,7 +180,8 @@ class ChatbotGUI:
             # 创建控制器
             self.controller = DSLController(
                 script_path=self.script_path,
-                llm_api_key=self.llm_api_key
+                llm_api_key=self.llm_api_key,
+                use_cache=self.use_cache
             )
 
             # 初始化
@@ -179,34 +199,19 @@ class ChatbotGUI:
     def update_status(self, message: str):
         """更新状态栏"""
         self.status_label.config(text=message)
-        self.root.update()
+        # 只刷新界面绘制，不在此处处理用户事件
+        self.root.update_idletasks()
 
     def add_message(self, sender: str, message: str, is_bot: bool = False):
         """添加消息到聊天窗口"""
         self.chat_display.config(state=tk.NORMAL)
 
         # 获取当前时间
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        timestamp = time.strftime("%H:%M:%S")
 
-        # 设置标签
+        # 插入消息（标签样式在创建聊天窗口时已配置）
         tag_name = "bot" if is_bot else "user"
-        bg_color = self.bot_color if is_bot else self.user_color
-
-        # 配置标签样式
-        self.chat_display.tag_config(tag_name,
-                                     background=bg_color,
-                                     relief=tk.RIDGE,
-                                     borderwidth=1,
-                                     lmargin1=10,
-                                     lmargin2=10,
-                                     rmargin=10,
-                                     spacing1=5,
-                                     spacing3=5
-                                     )
-
-        # 插入消息
-        self.chat_display.insert(tk.END, f"[{timestamp}] {sender}:\n", tag_name)
-        self.chat_display.insert(tk.END, f"{message}\n\n", tag_name)
+        self.chat_display.insert(tk.END, f"[{timestamp}] {sender}:\n{message}\n\n", tag_name)
 
         # 滚动到底部
         self.chat_display.see(tk.END)
@@ -235,7 +240,7 @@ class ChatbotGUI:
 
         try:
             # 检查退出命令
-            if user_input.lower() in ['退出', 'exit', 'quit', 'bye']:
+            if user_input.casefold() in EXIT_COMMANDS:
                 self.add_message("🤖 机器人", "👋 感谢使用，再见！", is_bot=True)
                 self.root.after(2000, self.on_exit)
                 return
@@ -243,85 +248,55 @@ class ChatbotGUI:
             # 更新状态
             self.update_status("正在处理您的消息...")
 
-            # 设置用户输入变量
-            self.controller.runtime.set_variable("$user_input", user_input)
-
-            # # 执行脚本
-            # replies = self.controller._execute_script()
-
-            # # 显示机器人回复
-            # for reply in replies:
-            #     self.add_message("🤖 机器人", reply, is_bot=True)
-
-            # # 恢复状态
-            # self.update_status("系统就绪，请输入消息...")
-            # 第一步：执行到get_intent并暂停
-            replies = self.controller._execute_script()
-
-            # 显示已经产生的回复（如果有）
-            for reply in replies:
-                self.add_message("🤖 机器人", reply, is_bot=True)
-
-            # 检查是否在get_intent处暂停
-            if self.controller.interpreter.is_execution_paused() and \
-                    self.controller.interpreter.get_pause_reason() == "get_intent":
-
-                # 显示意图识别中...
-                self.update_status("正在识别您的意图...")
-
-                # 手动触发意图识别
-                input_text = self.controller.runtime.get_variable("$user_input", "")
-
-                # 使用LLM识别意图
-                if self.controller.llm_classifier:
-                    try:
-                        intent = self.controller.llm_classifier.get_intent(
-                            input_text,
-                            self.controller.dsl_intents
-                        )
-                        print(f"🤖 LLM识别意图: {intent}")
-
-                        # 设置意图变量
-                        self.controller.runtime.set_variable("$intent", intent)
-
-                        # 恢复执行（继续执行if判断等）
-                        self.controller.interpreter.resume_execution()
-
-                        # 继续执行剩余脚本
-                        self.update_status("正在生成回复...")
-                        more_replies = self.controller._execute_script()
-
-
-                        # 显示剩余的回复
-                        for reply in more_replies:
-                            self.add_message("🤖 机器人", reply, is_bot=True)
-
-                    except Exception as e:
-                        print(f"⚠️ LLM识别失败: {e}")
-                        self.add_message("🤖 机器人",
-                                             "抱歉，意图识别失败，请重新输入。",
-                                             is_bot=True)
-                    # else:
-                    #     self.add_message("🤖 机器人",
-                    #                  "意图识别模块未初始化。",
-                    #                  is_bot=True)
-
-            # 恢复状态
-            self.update_status("系统就绪，请输入消息...")
+            # 在工作线程中执行脚本，界面在等待意图识别时保持响应，回复逐条交回Tk线程显示
+            self._pool.submit(self._run_turn, self.controller, user_input, self._generation)
 
         except Exception as e:
             error_msg = f"抱歉，处理消息时出现错误: {str(e)}"
             self.add_message("🤖 机器人", error_msg, is_bot=True)
             self.update_status("系统错误，请重试...")
 
+    def _run_turn(self, controller: DSLController, user_input: str, generation: int):
+        """在工作线程中执行一轮对话：脚本从上次暂停处继续执行，每产生一条回复就交给Tk线程显示"""
+        if generation != self._generation:
+            # 排队期间对话已清空或系统已重置，这一轮作废，不再执行
+            return
+        try:
+            # get_intent 由注册的外部函数在执行过程中完成，每轮只需执行一次
+            for reply in controller.execute_with_input_stream(user_input):
+                self._post(generation, self.add_message, "🤖 机器人", reply, True)
+        except Exception as e:
+            print(f"❌ 脚本执行错误: {e}")
+            self._post(generation, self.add_message, "🤖 机器人", f"抱歉，处理消息时出现错误: {str(e)}", True)
+            self._post(generation, self.update_status, "系统错误，请重试...")
+            return
+
+        # 恢复状态
+        self._post(generation, self.update_status, "系统就绪，请输入消息...")
+
+    def _post(self, generation: int, func: Callable, *args):
+        """把界面更新交给Tk线程执行，对话已清空或系统已重置时丢弃"""
+        def apply():
+            if generation == self._generation:
+                func(*args)
+
+        try:
+            self.root.after(0, apply)
+        except RuntimeError:
+            # 窗口已关闭
+            pass
+
     def clear_conversation(self):
         """清空对话"""
         self.chat_display.config(state=tk.NORMAL)
         self.chat_display.delete(1.0, tk.END)
         self.chat_display.config(state=tk.DISABLED)
 
+        # 之前提交但尚未显示的对话结果作废
+        self._generation += 1
         if self.controller:
-            self.controller.reset_conversation()
+            # 重置放到工作线程排队执行，避免与进行中的对话同时修改状态
+            self._pool.submit(self.controller.reset_conversation)
             self.add_message("🤖 机器人", "对话已清空，输入任意信息重新开始对话。", is_bot=True)
 
         messagebox.showinfo("清空对话", "对话记录已清空")
@@ -329,7 +304,11 @@ class ChatbotGUI:
     def reset_system(self):
         """重置系统"""
         if messagebox.askyesno("重置系统", "确定要重置系统吗？这将清空所有对话和状态。"):
+            old_controller = self.controller
             self.clear_conversation()
+            if old_controller:
+                # 旧控制器排在已提交的任务之后、在工作线程中关闭，释放其解释器的事件循环
+                self._pool.submit(old_controller.close)
             self.initialize_system()
 
     def show_history(self):
@@ -354,12 +333,12 @@ class ChatbotGUI:
         )
         history_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        # 显示历史记录
-        for item in history:
-            role = "用户" if item['role'] == 'user' else "机器人"
-            history_text.insert(tk.END,
-                                f"[{item['timestamp']}] {role}: {item['message']}\n{'=' * 50}\n"
-                                )
+        # 显示历史记录，拼成一个字符串后一次插入
+        separator = '=' * 50
+        history_text.insert(tk.END, "".join(
+            f"[{item.timestamp}] {'用户' if item.role == 'user' else '机器人'}: {item.message}\n{separator}\n"
+            for item in history
+        ))
 
         history_text.config(state=tk.DISABLED)
 
@@ -370,4 +349,11 @@ class ChatbotGUI:
 
     def run(self):
         """运行主循环"""
-        self.root.mainloop()
\ No newline at end of file
+        try:
+            self.root.mainloop()
+        finally:
+            # 取消排队中的对话，等正在进行的一轮结束（进程退出时本来也要等待工作线程），
+            # 再关闭控制器同步执行脚本用的事件循环
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            if self.controller:
+                self.controller.close()
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+意图识别客户端测试模块
+测试 BatchedIntentClassifier 的请求合并逻辑（使用不访问网络的分类器）
+"""
+import asyncio
+import unittest
+from types import SimpleNamespace
+from src.dsl.ai_client import IntentClassifier, BatchedIntentClassifier
+
+INTENTS = ["查询商品", "客服咨询", "退出系统"]
+
+
+class FakeClassifier(IntentClassifier):
+    """不访问网络的分类器：批量请求返回预设的回复，单条请求按消息查表"""
+    async_client = None
+
+    def __init__(self, batch_reply: str = "", single_results=None, single_error: Exception = None):
+        # 不调用父类初始化，避免创建真正的API客户端
+        self.cache_size = 16
+        self._cache = {}
+        self._prompt_cache = {}
+        self.batch_requests = []
+        self.single_requests = []
+        self.single_results = single_results or {}
+        self.single_error = single_error
+
+        async def create(**kwargs):
+            self.batch_requests.append(kwargs)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=batch_reply))])
+
+        self.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    async def get_intent_async(self, message, may_intent):
+        self.single_requests.append(message)
+        if self.single_error is not None:
+            raise self.single_error
+        return self.single_results.get(message, "其他")
+
+
+class TestBatchedIntentClassifier(unittest.TestCase):
+    """测试批量意图识别器"""
+
+    def classify_all(self, batcher, messages):
+        """在同一个事件循环上并发提交多条识别请求"""
+        async def run():
+            return await asyncio.gather(*(batcher.get_intent(message, INTENTS) for message in messages),
+                                        return_exceptions=True)
+        return asyncio.run(run())
+
+    def test_coalesce_concurrent_requests(self):
+        """测试并发请求合并为一次API调用，结果按顺序分发并写入缓存"""
+        classifier = FakeClassifier(batch_reply="1. 查询商品\n2、客服咨询\n退出系统")
+        batcher = BatchedIntentClassifier(classifier, batch_window=0)
+
+        results = self.classify_all(batcher, ["有什么手机", "找人工", "拜拜"])
+
+        self.assertEqual(results, ["查询商品", "客服咨询", "退出系统"])
+        self.assertEqual(len(classifier.batch_requests), 1)
+        self.assertEqual(classifier.batch_requests[0]["messages"][1]["content"], "1. 有什么手机\n2. 找人工\n3. 拜拜")
+        self.assertEqual(classifier.single_requests, [])
+        self.assertEqual(classifier._cache_get("找人工", frozenset(INTENTS)), "客服咨询")
+
+    def test_line_count_fallback(self):
+        """测试回复行数与消息数不符时逐条识别"""
+        classifier = FakeClassifier(batch_reply="查询商品", single_results={"找人工": "客服咨询"})
+        batcher = BatchedIntentClassifier(classifier, batch_window=0)
+
+        results = self.classify_all(batcher, ["有什么手机", "找人工"])
+
+        self.assertEqual(results, ["其他", "客服咨询"])
+        self.assertEqual(len(classifier.batch_requests), 1)
+        self.assertEqual(sorted(classifier.single_requests), ["找人工", "有什么手机"])
+
+    def test_exception_fan_out(self):
+        """测试识别出错时同一批的所有请求都收到异常"""
+        error = RuntimeError("识别失败")
+        classifier = FakeClassifier(batch_reply="", single_error=error)
+        batcher = BatchedIntentClassifier(classifier, batch_window=0)
+
+        results = self.classify_all(batcher, ["有什么手机", "找人工"])
+
+        self.assertEqual(results, [error, error])
+
+    def test_new_event_loop(self):
+        """测试上一个事件循环关闭后，在新的事件循环上仍能正常识别"""
+        classifier = FakeClassifier(single_results={"有什么手机": "查询商品", "找人工": "客服咨询"})
+        batcher = BatchedIntentClassifier(classifier, batch_window=0)
+
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(loop.run_until_complete(batcher.get_intent("有什么手机", INTENTS)), "查询商品")
+        finally:
+            loop.close()
+
+        result = asyncio.run(asyncio.wait_for(batcher.get_intent("找人工", INTENTS), timeout=1))
+        self.assertEqual(result, "客服咨询")
+
+
+class TestAsyncClientClose(unittest.TestCase):
+    """测试异步客户端的关闭"""
+
+    def test_aclose_current_loop(self):
+        """测试 aclose() 关闭当前事件循环上的客户端，其他事件循环上的客户端不受影响"""
+        classifier = FakeClassifier()
+        closed = []
+
+        async def close():
+            closed.append(True)
+
+        async def run():
+            classifier._async_client = SimpleNamespace(close=close)
+            classifier._async_client_loop = asyncio.get_running_loop()
+            await classifier.aclose()
+            self.assertIsNone(classifier._async_client)
+
+            classifier._async_client = SimpleNamespace(close=close)
+            classifier._async_client_loop = object()
+            await classifier.aclose()
+            self.assertIsNotNone(classifier._async_client)
+
+        asyncio.run(run())
+        self.assertEqual(closed, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,13 @@
 测试 DSLController 类的功能
 """
 import unittest
+import io
+import asyncio
 import tempfile
 import os
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import Mock, patch, MagicMock
 from src.dsl.main_controller import DSLController
 
@@ -64,7 +69,7 @@ class TestDSLController(unittest.TestCase):
         self.assertEqual(controller.llm_api_key, "test_api_key")
         self.assertIsNotNone(controller.runtime)
         self.assertIsNotNone(controller.interpreter)
-        self.assertEqual(controller.conversation_history, [])
+        self.assertEqual(list(controller.conversation_history), [])
 
     @patch('main_controller.IntentClassifier')
     def test_initialize_success(self, mock_intent_classifier):
@@ -302,5 +307,186 @@ class TestDSLController(unittest.TestCase):
             controller._load_and_parse_script()
 
 
+class TestParseCache(unittest.TestCase):
+    """测试脚本解析结果的磁盘缓存"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.script_path = os.path.join(self.temp_dir, "test.dsl")
+        with open(self.script_path, 'w', encoding='utf-8') as f:
+            f.write('intents {"查询"}\nstart:\nreply "你好"\n')
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+        patcher = patch('src.dsl.main_controller._CACHE_DIR', Path(self.cache_dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def parse(self, controller):
+        """像 initialize 一样先读缓存，未命中时解析并写入缓存"""
+        with redirect_stdout(io.StringIO()):
+            if controller._load_cached_script():
+                return True
+            controller._extract_dsl_info()
+            controller._load_and_parse_script()
+            controller._store_cached_script()
+        return False
+
+    def test_cache_off_by_default(self):
+        """测试默认不读写磁盘缓存"""
+        self.assertFalse(self.parse(DSLController(self.script_path)))
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_cache_round_trip(self):
+        """测试开启缓存后，第二次直接读出相同的语法树、意图和标签"""
+        first = DSLController(self.script_path, use_cache=True)
+        self.assertFalse(self.parse(first))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        second = DSLController(self.script_path, use_cache=True)
+        self.assertTrue(self.parse(second))
+        self.assertEqual(repr(second.script_ast.statements), repr(first.script_ast.statements))
+        self.assertEqual(second.parsed_intents, ["查询"])
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), "需要POSIX文件权限")
+    def test_cache_refuses_writable_dir(self):
+        """测试缓存目录可被他人写入时不读取其中的pickle文件"""
+        self.assertFalse(self.parse(DSLController(self.script_path, use_cache=True)))
+        os.chmod(self.cache_dir, 0o777)
+
+        self.assertFalse(self.parse(DSLController(self.script_path, use_cache=True)))
+
+
+class FakeIntentSource:
+    """代替批量意图识别器的协程，记录同时进行的识别数"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def get_intent(self, message, may_intent):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return "查询商品" if "商品" in message else "其他"
+
+
+class TestRunMany(unittest.TestCase):
+    """测试在同一个事件循环上并发执行多个对话"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        script_path = os.path.join(self.temp_dir, "test.dsl")
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write('''intents {"查询商品", "其他"}
+start:
+reply "欢迎"
+pause_for_user_input
+get_intent $user_input
+if $intent == "查询商品" then goto query:
+reply "未识别: $user_input"
+exit
+query:
+reply "商品: $user_input"
+exit
+''')
+        self.controller = DSLController(script_path)
+        with redirect_stdout(io.StringIO()):
+            self.controller.initialize()
+        self.intents = FakeIntentSource()
+        self.controller.batched_classifier = self.intents
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir)
+
+    def test_results_in_input_order(self):
+        """测试结果与输入顺序一致，各对话互不影响"""
+        inputs = [f"商品{i}" if i % 2 else f"你好{i}" for i in range(6)]
+
+        with redirect_stdout(io.StringIO()):
+            results = asyncio.run(self.controller.run_many(inputs, concurrency_limit=2))
+
+        self.assertEqual(results, [
+            ["欢迎", f"商品: {user_input}" if "商品" in user_input else f"未识别: {user_input}"]
+            for user_input in inputs
+        ])
+        # 原控制器的运行时不受各对话影响
+        self.assertEqual(self.controller.runtime.get_variable("$user_input"), "")
+
+    def test_concurrency_limit(self):
+        """测试同时进行的对话数达到且不超过concurrency_limit"""
+        with redirect_stdout(io.StringIO()):
+            asyncio.run(self.controller.run_many([f"商品{i}" for i in range(6)], concurrency_limit=3))
+
+        self.assertEqual(self.intents.peak, 3)
+
+
+class TestCompileOnce(unittest.TestCase):
+    """测试脚本只在第一次执行前编译"""
+
+    def test_script_without_labels(self):
+        """测试没有标签的脚本在多轮执行中不会重新编译"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            script_path = os.path.join(temp_dir, "test.dsl")
+            with open(script_path, 'w', encoding='utf-8') as f:
+                f.write('reply "你好"\nexit\n')
+            controller = DSLController(script_path)
+            with redirect_stdout(io.StringIO()):
+                controller.initialize()
+
+            output = io.StringIO()
+            with redirect_stdout(output):
+                controller._prepare_execution()
+                controller._prepare_execution()
+            self.assertEqual(output.getvalue().count("扫描标签定义"), 1)
+            self.assertIs(controller.interpreter._compiled_for, controller.script_ast)
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir)
+
+
+class TestIterationLimit(unittest.TestCase):
+    """测试一轮执行中的死循环保护"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        script_path = os.path.join(self.temp_dir, "test.dsl")
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write('loop:\nget_intent $user_input\ngoto loop:\n')
+        self.controller = DSLController(script_path)
+        with redirect_stdout(io.StringIO()):
+            self.controller.initialize()
+
+        async def get_intent(message, may_intent):
+            return "其他"
+
+        self.controller.batched_classifier = SimpleNamespace(get_intent=get_intent)
+
+    def tearDown(self):
+        import shutil
+        self.controller.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_stream_loop_stops(self):
+        """测试逐条产出回复时死循环被中止"""
+        with redirect_stdout(io.StringIO()):
+            with self.assertRaisesRegex(RuntimeError, "可能检测到无限循环"):
+                list(self.controller.execute_with_input_stream("你好"))
+
+    def test_async_loop_stops(self):
+        """测试协程执行时死循环被中止并返回错误回复"""
+        output = io.StringIO()
+        with redirect_stdout(output):
+            replies = asyncio.run(self.controller.execute_with_input_async("你好"))
+
+        self.assertEqual(replies, ["抱歉，系统出现错误，请稍后再试。"])
+        self.assertIn("可能检测到无限循环", output.getvalue())
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -2,20 +2,33 @@
 解释器测试模块
 测试 Interpreter 类的执行逻辑
 """
+import asyncio
 import unittest
-from unittest.mock import Mock, patch, MagicMock
-from ..src.dsl.runtime import RuntimeEnvironment
-from ..src.dsl.better_interpreter import Interpreter
-from ..src.dsl.nodes import *
+from src.dsl.runtime import RuntimeEnvironment
+from src.dsl.better_interpreter import Interpreter
+from src.dsl.bytecode import compile_template
+from src.dsl.nodes import *
 
 
 class TestInterpreter(unittest.TestCase):
     """测试解释器"""
 
+    @classmethod
+    def setUpClass(cls):
+        """整个测试类共用一个运行时环境和解释器"""
+        cls.runtime = RuntimeEnvironment()
+        cls.interpreter = Interpreter(cls.runtime)
+
+    @classmethod
+    def tearDownClass(cls):
+        """关闭解释器同步执行时创建的事件循环"""
+        cls.interpreter.close()
+
     def setUp(self):
-        """测试前置设置"""
-        self.runtime = RuntimeEnvironment()
-        self.interpreter = Interpreter(self.runtime)
+        """测试前置设置：重置共用的运行时环境和解释器状态"""
+        self.runtime.reset()
+        self.interpreter.external_functions.clear()
+        self.interpreter.resume_execution()
 
     def create_mock_script(self, statements):
         """创建模拟脚本"""
@@ -72,14 +85,45 @@ class TestInterpreter(unittest.TestCase):
         ]
         script = self.create_mock_script(script_statements)
         self.interpreter._scan_labels(script)
+        self.interpreter._compile(script)
+
+        # 标签行被剔除，跳转目标为执行序列中标签之后的第一条语句
+        self.assertEqual(self.interpreter._jump_targets["main_loop"], 0)
+        self.assertFalse(hasattr(goto_node, "target_line"))
+        self.assertEqual(self.interpreter.get_statement_count(), 2)
+
+    def test_execute_inline_jumps(self):
+        """测试set/if/goto连续执行"""
+        script = self.create_mock_script([
+            SetNode("$choice", "b"),
+            IfNode("$choice", "a", "branch_a"),
+            GotoNode("branch_b"),
+            LabelNode("branch_a"),
+            ReplyNode("A"),
+            LabelNode("branch_b"),
+            ReplyNode("B: $choice"),
+            ExitNode(),
+            ReplyNode("unreachable"),
+        ])
+
+        replies = self.interpreter.execute_script(script)
+
+        self.assertEqual(replies, ["B: b"])
+        self.assertTrue(self.runtime.should_exit)
+
+    def test_compile_undefined_label(self):
+        """测试跳转到未定义的标签"""
+        script = self.create_mock_script([GotoNode("nowhere")])
+        self.interpreter._scan_labels(script)
 
+        with self.assertRaises(RuntimeError):
+            self.interpreter._compile(script)
 
     def test_execute_exit_alternative(self):
         """测试执行exit语句（替代方法）"""
         # 方法1：直接测试退出标志的设置
         self.runtime.should_exit = True
         self.assertTrue(self.runtime.should_exit)
-        print("✅ test_execute_exit_alternative（方法1）通过")
 
     def test_execute_exit_via_runtime(self):
         """通过运行时环境测试退出功能"""
@@ -87,7 +131,6 @@ class TestInterpreter(unittest.TestCase):
         self.assertFalse(self.runtime.should_exit)
         self.runtime.should_exit = True
         self.assertTrue(self.runtime.should_exit)
-        print("✅ test_execute_exit_via_runtime 通过")
 
     def test_execute_pause_for_input(self):
         """测试执行pause_for_user_input"""
@@ -105,15 +148,18 @@ class TestInterpreter(unittest.TestCase):
         # 包含变量的字符串
         test_string = "你好，$name，你今年$age岁"
 
-        # 直接测试解析方法（如果存在）
-        if hasattr(self.interpreter, '_resolve_variables_in_string'):
-            result = self.interpreter._resolve_variables_in_string(test_string)
-            self.assertEqual(result, "你好，Alice，你今年25岁")
-        else:
-            # 如果方法不存在，跳过此测试
-            self.skipTest("_resolve_variables_in_string 方法不存在")
+        # 拆分为模板片段（变量引用替换为变量槽下标）后拼接
+        segments = compile_template(test_string, self.runtime.intern)
+        self.assertEqual(self.interpreter._render(segments), "你好，Alice，你今年25岁")
 
-        print("✅ test_resolve_variables_in_string 通过")
+    def test_execute_compiled_reply(self):
+        """测试回复按编译时生成的模板片段填入变量，未定义的变量替换为空字符串"""
+        script = self.create_mock_script([ReplyNode("{你好} $name$missing")])
+        self.interpreter._scan_labels(script)
+        self.interpreter._compile(script)
+        self.runtime.set_variable("$name", "Alice")
+
+        self.assertEqual(self.interpreter._execute_current(), "{你好} Alice")
 
     def test_external_function_registration(self):
         """测试外部函数注册"""
@@ -127,7 +173,85 @@ class TestInterpreter(unittest.TestCase):
         self.assertIn("double", self.interpreter.external_functions)
         self.assertEqual(self.interpreter.external_functions["double"](5), 10)
 
-        print("✅ test_external_function_registration 通过")
+    def test_async_external_function(self):
+        """测试协程形式的外部函数"""
+
+        async def get_intent(user_input):
+            return "查询:" + user_input
+
+        self.interpreter.register_function("get_intent", get_intent)
+        self.runtime.set_variable("$user_input", "手机")
+        script = self.create_mock_script([GetIntentNode("$user_input"), ReplyNode("$intent")])
+
+        self.assertEqual(self.interpreter.execute_script(script), ["查询:手机"])
+
+    def test_sync_execution_in_running_loop(self):
+        """测试在运行中的事件循环里同步执行协程外部函数时给出明确的错误"""
+
+        async def get_intent(user_input):
+            return "其他"
+
+        self.interpreter.register_function("get_intent", get_intent)
+        script = self.create_mock_script([GetIntentNode("$user_input")])
+
+        async def run():
+            return self.interpreter.execute_script(script)
+
+        with self.assertRaisesRegex(RuntimeError, "execute_script_block_async"):
+            asyncio.run(run())
+
+    def test_close_event_loop(self):
+        """测试关闭同步执行时创建的事件循环，之后仍可再次执行"""
+
+        async def get_intent(user_input):
+            return "查询:" + user_input
+
+        self.interpreter.register_function("get_intent", get_intent)
+        self.runtime.set_variable("$user_input", "手机")
+        script = self.create_mock_script([GetIntentNode("$user_input"), ReplyNode("$intent")])
+        self.interpreter.execute_script(script)
+        loop = self.interpreter._loop
+
+        self.interpreter.close()
+
+        self.assertTrue(loop.is_closed())
+        self.runtime.reset()
+        self.assertEqual(self.interpreter.execute_script(script), ["查询:"])
+
+    def test_execute_script_step_async(self):
+        """测试协程版单步执行在调用方的事件循环中等待意图识别"""
+
+        async def get_intent(user_input):
+            await asyncio.sleep(0)
+            return "查询:" + user_input
+
+        self.interpreter.register_function("get_intent", get_intent)
+        self.runtime.set_variable("$user_input", "耳机")
+        script = self.create_mock_script([GetIntentNode("$user_input"), ReplyNode("$intent")])
+        self.interpreter._scan_labels(script)
+        self.interpreter._compile(script)
+
+        async def run():
+            return [await self.interpreter.execute_script_step_async(script) for _ in range(3)]
+
+        self.assertEqual(asyncio.run(run()), [None, "查询:耳机", None])
+
+    def test_execute_script_block(self):
+        """测试按基本块执行：连续的回复一次返回，在交互指令处结束"""
+        self.interpreter.register_function("get_intent", lambda user_input: "其他")
+        script = self.create_mock_script([
+            ReplyNode("A"),
+            SetNode("$x", "1"),
+            ReplyNode("x=$x"),
+            GetIntentNode("$user_input"),
+            ReplyNode("$intent"),
+        ])
+        self.interpreter._scan_labels(script)
+        self.interpreter._compile(script)
+
+        self.assertEqual(self.interpreter.execute_script_block(script), ["A", "x=1"])
+        self.assertEqual(self.interpreter.execute_script_block(script), ["其他"])
+        self.assertEqual(self.interpreter.execute_script_block(script), [])
 
     def test_runtime_variable_operations(self):
         """测试运行时变量操作"""
@@ -143,22 +267,17 @@ class TestInterpreter(unittest.TestCase):
         nonexistent = self.runtime.get_variable("$nonexistent", "default")
         self.assertEqual(nonexistent, "default")
 
-        print("✅ test_runtime_variable_operations 通过")
-
     def test_interpreter_initialization(self):
         """测试解释器初始化"""
         self.assertIsNotNone(self.interpreter.runtime)
         self.assertIsInstance(self.interpreter.runtime, RuntimeEnvironment)
         self.assertIsInstance(self.interpreter.external_functions, dict)
 
-        print("✅ test_interpreter_initialization 通过")
-
     def test_skip_exit_node_test(self):
         """跳过ExitNode测试（因为您的实现可能处理方式不同）"""
         # 这是一个占位测试，说明我们跳过了ExitNode测试
         # 因为您的实际代码可以运行，说明ExitNode已被正确处理
         self.skipTest("跳过ExitNode测试 - 您的实现已正确处理此节点类型")
-        print("⚠️ 跳过ExitNode测试")
 
     def test_pause_and_resume(self):
         """测试暂停和恢复执行"""
@@ -170,8 +289,6 @@ class TestInterpreter(unittest.TestCase):
             self.interpreter.resume_execution()
             self.assertFalse(self.interpreter.is_execution_paused())
 
-        print("✅ test_pause_and_resume 通过")
-
 
 def run_all_tests():
     """运行所有测试"""
@@ -179,17 +296,7 @@ def run_all_tests():
     print("开始运行解释器测试")
     print("=" * 60)
 
-    # 创建测试套件
-    suite = unittest.TestSuite()
-
-    # 添加测试，排除可能有问题的方法
-    test_loader = unittest.TestLoader()
-
-    # 获取所有测试方法
-    test_methods = [method for method in dir(TestInterpreter)
-                    if method.startswith('test_')]
-
-    # 按顺序添加测试
+    # 按顺序排列的测试，未列出的测试按名称排在后面
     test_order = [
         'test_interpreter_initialization',
         'test_runtime_variable_operations',
@@ -209,11 +316,15 @@ def run_all_tests():
         'test_execute_exit_via_runtime',
         'test_skip_exit_node_test'
     ]
+    rank = {name: i for i, name in enumerate(test_order)}
 
-    # 添加测试
-    for test_name in test_order:
-        if hasattr(TestInterpreter, test_name):
-            suite.addTest(TestInterpreter(test_name))
+    def sort_key(name):
+        return rank.get(name, len(rank)), name
+
+    # 一次加载整个测试类，再按上面的顺序排序
+    test_loader = unittest.TestLoader()
+    test_loader.sortTestMethodsUsing = lambda a, b: (sort_key(a) > sort_key(b)) - (sort_key(a) < sort_key(b))
+    suite = test_loader.loadTestsFromTestCase(TestInterpreter)
 
     # 运行测试
     runner = unittest.TextTestRunner(verbosity=2)
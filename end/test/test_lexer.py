@@ -3,7 +3,7 @@
 测试 Lexer 类的 tokenize 方法
 """
 import unittest
-from ..src.dsl.lexer import Lexer, TokenType
+from ..src.dsl.lexer import Lexer, TokenType, tokenize_cached
 
 
 class TestLexer(unittest.TestCase):
@@ -20,6 +20,16 @@ class TestLexer(unittest.TestCase):
         self.assertEqual(tokens[1].type, TokenType.STRING)
         self.assertEqual(tokens[1].value, "Hello")
 
+    def test_tokenize_cached(self):
+        """测试相同源码复用缓存的token元组"""
+        source = 'reply "Hello"'
+        tokens = tokenize_cached(source)
+
+        self.assertIsInstance(tokens, tuple)
+        self.assertIs(tokenize_cached(source), tokens)
+        self.assertEqual([(t.type, t.value) for t in tokens],
+                         [(t.type, t.value) for t in Lexer(source).tokenize()])
+
     def test_variable_token(self):
         """测试变量Token"""
         source = '$intent == "查询商品"'
@@ -113,6 +123,18 @@ class TestLexer(unittest.TestCase):
         with self.assertRaises(SyntaxError):
             lexer.tokenize()
 
+    def test_keyword_prefix_label(self):
+        """测试以关键字开头的标签不会被拆分"""
+        source = 'goto settings:\nexit:'
+        lexer = Lexer(source)
+        tokens = lexer.tokenize()
+
+        self.assertEqual(tokens[0].type, TokenType.GOTO)
+        self.assertEqual(tokens[1].type, TokenType.LABEL)
+        self.assertEqual(tokens[1].value, "settings")
+        self.assertEqual(tokens[3].type, TokenType.LABEL)
+        self.assertEqual(tokens[3].value, "exit")
+
     def test_empty_string(self):
         """测试空字符串"""
         source = 'reply ""'
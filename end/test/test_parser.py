@@ -3,9 +3,8 @@
 测试 Parser 类的 parse 方法
 """
 import unittest
-from unittest.mock import Mock
 from src.dsl.lexer import Lexer, TokenType
-from src.dsl.parser import Parser
+from src.dsl.parser import Parser, parse_cached
 from src.dsl.nodes import *
 
 
@@ -13,11 +12,17 @@ class TestParser(unittest.TestCase):
     """测试语法分析器"""
 
     def parse_source(self, source):
-        """辅助方法：解析源代码"""
-        lexer = Lexer(source)
-        tokens = lexer.tokenize()
-        parser = Parser(tokens)
-        return parser.parse()
+        """辅助方法：解析源代码（相同源码复用缓存的语法树）"""
+        return parse_cached(source)
+
+    def test_parse_cached(self):
+        """测试相同源码返回同一棵语法树"""
+        source = 'reply "Hello"'
+        script = self.parse_source(source)
+
+        self.assertIs(self.parse_source(source), script)
+        parse_cached.cache_clear()
+        self.assertIsNot(self.parse_source(source), script)
 
     def test_parse_reply(self):
         """测试解析reply语句"""
@@ -41,6 +46,24 @@ class TestParser(unittest.TestCase):
         self.assertEqual(script.statements[0].name, "process_intent")
         self.assertFalse(script.statements[0].is_definition)
 
+    def test_label_nodes_shared(self):
+        """测试同名标签共用一个节点实例"""
+        first = LabelNode("start")
+        second = LabelNode("start")
+        definition = LabelNode("start", is_definition=True)
+
+        self.assertIs(first, second)
+        self.assertIsNot(definition, first)
+        self.assertTrue(definition.is_definition)
+        # 解析得到的标签同样是共用实例
+        self.assertIs(self.parse_source('start:\nreply "a"').statements[0], first)
+
+    def test_label_node_immutable(self):
+        """测试共用的标签节点不能修改属性"""
+        label = LabelNode("start")
+        with self.assertRaises(AttributeError):
+            label.name = "other"
+        self.assertEqual(LabelNode("start").name, "start")
 
     def test_parse_get_intent(self):
         """测试解析get_intent语句"""
@@ -161,6 +184,10 @@ class TestParser(unittest.TestCase):
         self.assertIn(GotoNode, node_types)
         self.assertIn(ExitNode, node_types)
 
+        # 所有节点都使用 __slots__，不带实例字典
+        for node in (script, *script.statements):
+            self.assertFalse(hasattr(node, '__dict__'), type(node).__name__)
+
     def test_syntax_error(self):
         """测试语法错误"""
         source = 'reply'  # 缺少字符串
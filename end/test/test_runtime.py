@@ -9,9 +9,14 @@ from ..src.dsl.runtime import RuntimeEnvironment
 class TestRuntimeEnvironment(unittest.TestCase):
     """测试运行时环境"""
 
+    @classmethod
+    def setUpClass(cls):
+        """整个测试类共用一个运行时环境"""
+        cls.runtime = RuntimeEnvironment()
+
     def setUp(self):
-        """测试前置设置"""
-        self.runtime = RuntimeEnvironment()
+        """测试前置设置：重置共用的运行时环境"""
+        self.runtime.reset()
 
     def test_set_and_get_variable(self):
         """测试变量设置和获取"""
@@ -79,10 +84,12 @@ class TestRuntimeEnvironment(unittest.TestCase):
         self.runtime.set_defined_intents(intents)
         retrieved = self.runtime.get_defined_intents()
 
-        self.assertEqual(retrieved, intents)
-        # 返回的应该是副本
-        retrieved.append("新意图")
-        self.assertEqual(len(self.runtime.defined_intents), 3)
+        self.assertEqual(retrieved, tuple(intents))
+        # 修改传入的列表不影响已保存的意图
+        intents.append("新意图")
+        self.assertEqual(len(self.runtime.get_defined_intents()), 3)
+        self.assertTrue(self.runtime.is_defined_intent("客服咨询"))
+        self.assertFalse(self.runtime.is_defined_intent("新意图"))
 
     def test_current_script_reference(self):
         """测试当前脚本引用"""
@@ -100,8 +107,7 @@ class TestRuntimeEnvironment(unittest.TestCase):
             "counter": 1
         }
 
-        for name, value in variables.items():
-            self.runtime.set_variable(name, value)
+        self.runtime.update_variables(variables)
 
         for name, expected in variables.items():
             actual = self.runtime.get_variable(name)
@@ -117,6 +123,43 @@ class TestRuntimeEnvironment(unittest.TestCase):
         self.assertEqual(self.runtime.get_variable("$counter"), 2)
         self.assertEqual(len(self.runtime.variables), 1)
 
+    def test_variables_view_writes(self):
+        """测试通过variables赋值、update和删除会写入变量槽"""
+        self.runtime.variables["name"] = "Alice"
+        self.runtime.variables.update({"$city": "Beijing", "age": 25})
+
+        self.assertEqual(self.runtime.get_variable("$name"), "Alice")
+        self.assertEqual(self.runtime.get_variable("city"), "Beijing")
+        self.assertEqual(self.runtime.variables["$age"], 25)
+
+        del self.runtime.variables["city"]
+        self.assertIsNone(self.runtime.get_variable("$city"))
+        self.assertNotIn("city", self.runtime.variables)
+        self.assertEqual(dict(self.runtime.variables), {"name": "Alice", "age": 25})
+        with self.assertRaises(KeyError):
+            self.runtime.variables["city"]
+
+    def test_variable_slots(self):
+        """测试变量槽"""
+        self.runtime.set_variable("$name", "Alice")
+        slot = self.runtime.intern("$name")
+
+        # 按名称设置的值与槽位共用同一存储，重复分配返回同一槽位
+        self.assertEqual(self.runtime.var_slots[slot], "Alice")
+        self.assertEqual(self.runtime.intern("name"), slot)
+
+        self.runtime.set_variable("name", "Bob")
+        self.assertEqual(self.runtime.get_variable("$name"), "Bob")
+
+        self.runtime.set_slot(slot, "Carol")
+        self.assertEqual(self.runtime.get_slot(slot), "Carol")
+        self.assertEqual(self.runtime.variables, {"name": "Carol"})
+
+        # 重置后槽位保留，值被清空
+        self.runtime.reset()
+        self.assertIsNone(self.runtime.get_variable("$name"))
+        self.assertEqual(self.runtime.intern("$name"), slot)
+
     def test_label_overwrite(self):
         """测试标签覆盖"""
         self.runtime.register_label("main", 5)